@@ -22,6 +22,64 @@ conditions:
     WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
     FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
     OTHER DEALINGS IN THE SOFTWARE.
+
+Submodules are only imported when one of their names is first used, so that
+importing mockaccino stays cheap for processes that don't use all of it
 '''
 
-from mocks import *
+import importlib
+import sys
+import types
+
+# Public names of the package, by the submodule that defines them. Those
+# submodules take their __all__ from here
+_EXPORTS = {
+    "mocks": ["create_mock", "replay", "clone", "reset", "stream",
+              "record_all", "blueprint_cache_info", "clear_blueprint_cache",
+              "BlueprintCacheInfo", "Expectation", "UnexpectedCallError",
+              "Mock", "MockMethod"],
+    "recording": ["create_recorder", "RecordingProxy"],
+    "cassettes": ["save_cassette", "load_cassette"],
+    "shared": ["share"],
+}
+
+_SUBMODULES = frozenset(["benchmarks", "cassettes", "matchers", "mocks",
+                         "recording", "server", "shared", "stats", "timing"])
+
+_ORIGINS = dict((name, submodule) for (submodule, names) in _EXPORTS.items()
+                for name in names)
+
+__all__ = sorted(_ORIGINS)
+
+
+class _LazyPackage(types.ModuleType):
+    '''
+    Takes the package's place in sys.modules, and imports the submodule that
+    defines a name when it's first looked up. Module level __getattr__ isn't
+    available before Python 3.7
+    '''
+    def __getattr__(self, name):
+        # Only called for names not set on the module yet
+        if name in _ORIGINS:
+            module = importlib.import_module("." + _ORIGINS[name], __name__)
+            value = getattr(module, name)
+        elif name in _SUBMODULES:
+            value = importlib.import_module("." + name, __name__)
+        else:
+            raise AttributeError("module %r has no attribute %r" %
+                                 (__name__, name))
+
+        setattr(self, name, value)
+
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(_ORIGINS) | _SUBMODULES)
+
+
+_package = _LazyPackage(__name__)
+_package.__dict__.update(sys.modules[__name__].__dict__)
+# Python 2 clears the globals of a module once it's gone, and the methods
+# above still use them
+_package._original = sys.modules[__name__]
+sys.modules[__name__] = _package
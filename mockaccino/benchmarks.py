@@ -0,0 +1,446 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright (c) 2012, Paolo Victor.
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+    OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+    NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+    HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+    WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+
+Benchmarks for mockaccino's hot paths. Run them with:
+
+    python -m mockaccino.benchmarks [--json results.json]
+                                    [--baseline benchmark_baseline.json]
+
+Results are times in nanoseconds per operation, except for the
+"expectation_footprint" memory cases, in bytes. Each time is the lowest of
+--repeat runs. When given a baseline (the results of a previous run, as
+written by --json), cases that got slower than it by more than their
+tolerance are run again, and those still slower are reported as regressions
+and make the run exit with status 1. So does a cold import of mockaccino,
+and the lookup of create_mock, taking longer than IMPORT_BUDGET. With fewer
+than MIN_REPEAT runs per case, results are only reported, as a single run
+can't tell a regression from noise. Times are compared relative to the
+"reference" case, plain Python calls timed in the same run, so that a
+baseline from another machine still applies
+'''
+
+from __future__ import print_function
+
+import argparse
+import compileall
+import gc
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import mockaccino
+from mockaccino.matchers import any, any_of, between, shape
+
+
+class Service(object):
+    def call(self, n, flag=None): pass
+
+    def other(self): pass
+
+
+# A class with a wide API, of which tests use only a few methods
+WideService = type("WideService", (object,),
+                   dict(("method_%d" % i, lambda self: None)
+                        for i in range(500)))
+
+
+def function_to_mock(n):
+    return n
+
+
+def best_of(run, repeat=5):
+    '''
+    Returns the lowest of repeat results of run, the least disturbed one
+    '''
+    return min(run() for i in range(repeat))
+
+
+def per_operation(operation, number):
+    '''
+    Returns the mean time, in nanoseconds, taken by number calls to
+    operation
+    '''
+    start = timeit.default_timer()
+
+    for i in range(number):
+        operation()
+
+    return (timeit.default_timer() - start) * 1e9 / number
+
+
+def reference_cost(number=100000):
+    '''
+    Returns the mean time, in nanoseconds, of a call to a real object's
+    method, against which the other cases are compared
+    '''
+    service = Service()
+
+    return per_operation(lambda: service.call(1, flag=None), number)
+
+
+def create_mock_cost(cls, number=10000):
+    mockaccino.create_mock(cls)
+
+    return per_operation(lambda: mockaccino.create_mock(cls), number)
+
+
+def record_cost(size=10000):
+    mock = mockaccino.create_mock(Service)
+    call = mock.call
+
+    start = timeit.default_timer()
+
+    for i in range(size):
+        call(i)
+
+    return (timeit.default_timer() - start) * 1e9 / size
+
+
+def record_all_cost(size=10000):
+    '''
+    Returns the mean time, in nanoseconds, spent recording each of the calls
+    of record_cost at once, with record_all
+    '''
+    mock = mockaccino.create_mock(Service)
+    calls = [("call", (i,), None, None, None) for i in range(size)]
+
+    start = timeit.default_timer()
+    mockaccino.record_all(mock, calls)
+
+    return (timeit.default_timer() - start) * 1e9 / size
+
+
+def replay_cost(size, min_calls=100000):
+    '''
+    Returns the mean time, in nanoseconds, spent replaying each of size
+    recorded sequential expectations. Small sizes are repeated on fresh mocks
+    until at least min_calls calls were timed
+    '''
+    elapsed = 0.0
+    calls = 0
+
+    while calls < min_calls:
+        mock = mockaccino.create_mock(Service)
+
+        for i in range(size):
+            mock.call(i)
+
+        mockaccino.replay(mock)
+        call = mock.call
+
+        start = timeit.default_timer()
+
+        for i in range(size):
+            call(i)
+
+        elapsed += timeit.default_timer() - start
+        calls += size
+
+    return elapsed * 1e9 / calls
+
+
+def always_replay_cost(number=100000):
+    mock = mockaccino.create_mock(Service)
+    mock.call(1).will_return(2).always()
+    mockaccino.replay(mock)
+
+    return per_operation(lambda: mock.call(1), number)
+
+
+def large_argument_cost(size=100000, number=1000):
+    '''
+    Returns the mean time, in nanoseconds, taken to replay a call whose
+    argument is a tuple of size items, passed as the very recorded object or
+    as an equal copy, alternately
+    '''
+    payload = tuple(range(size))
+    copy = tuple(range(size))
+    mock = mockaccino.create_mock(Service)
+    mock.call(payload).will_return(1).always()
+    mockaccino.replay(mock)
+
+    return per_operation(lambda: (mock.call(payload), mock.call(copy)),
+                         number) / 2
+
+
+def matcher_check_cost(number=100000):
+    expectation = mockaccino.Expectation(
+            "call", (any(int), between(0, 10)),
+            {"flag": shape({"ids": [any(int), any(int)],
+                            "mode": any_of("fast", "slow")})})
+    arguments = ((1, 5), {"flag": {"ids": [1, 2], "mode": "slow"}})
+
+    return per_operation(lambda: expectation.check("call", *arguments),
+                         number)
+
+
+def function_mock_cost(number=100000):
+    mock = mockaccino.create_mock(function_to_mock)
+    mock(1).will_return(1).times(number)
+    mockaccino.replay(mock)
+
+    return per_operation(lambda: mock(1), number)
+
+
+# Nanoseconds a new process may take to import mockaccino and look up
+# create_mock
+IMPORT_BUDGET = 20e6
+
+_IMPORT_SCRIPT = ("import timeit\n"
+                  "start = timeit.default_timer()\n"
+                  "import mockaccino\n"
+                  "mockaccino.create_mock\n"
+                  "print(timeit.default_timer() - start)\n")
+
+
+def import_cost():
+    '''
+    Returns the time, in nanoseconds, a new interpreter takes to import
+    mockaccino and look up create_mock. A copy of the package is imported,
+    byte-compiled first as it is once installed, so that compiling its
+    sources isn't timed along with the import. The package itself is left
+    as it is, as it may not be writable
+    '''
+    package = os.path.dirname(os.path.abspath(__file__))
+    root = tempfile.mkdtemp()
+
+    try:
+        copy = os.path.join(root, "mockaccino")
+        shutil.copytree(package, copy,
+                        ignore=shutil.ignore_patterns("*.pyc", "__pycache__"))
+
+        if not compileall.compile_dir(copy, quiet=1):
+            raise ValueError("mockaccino could not be byte-compiled")
+
+        output = subprocess.check_output(
+                [sys.executable, "-c", _IMPORT_SCRIPT], cwd=root)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    return float(output) * 1e9
+
+
+def expectation_footprint(size=100000, distinct=10):
+    '''
+    Returns the mean memory, in bytes, taken by each of size recorded
+    expectations with distinct different argument values, or None if
+    tracemalloc isn't available
+    '''
+    if tracemalloc is None:
+        return None
+
+    mock = mockaccino.create_mock(Service)
+    gc.collect()
+    tracemalloc.start()
+
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+
+        for i in range(size):
+            mock.call(i % distinct, flag=True).will_return(None)
+
+        mockaccino.replay(mock)
+
+        return (tracemalloc.get_traced_memory()[0] - before) / float(size)
+    finally:
+        tracemalloc.stop()
+
+
+# Name of the case that times are scaled by when compared to a baseline
+REFERENCE = "reference"
+
+# Cases that are not times, and are compared as they are
+UNSCALED = frozenset(["expectation_footprint",
+                      "expectation_footprint_unique"])
+
+# Memory cases, with arguments shared by many expectations or unique to each
+FOOTPRINTS = [
+    ("expectation_footprint", expectation_footprint),
+    ("expectation_footprint_unique",
+     lambda: expectation_footprint(distinct=100000)),
+]
+
+# Sequential replay of growing scripts, whose cost per call should be flat
+SCALING_SIZES = (10, 1000, 100000, 1000000)
+
+CASES = [
+    (REFERENCE, reference_cost),
+    ("create_mock_small", lambda: create_mock_cost(Service)),
+    ("create_mock_wide", lambda: create_mock_cost(WideService)),
+    ("record", record_cost),
+    ("record_all", record_all_cost),
+    ("replay_sequential", lambda: replay_cost(1000)),
+    ("replay_always", always_replay_cost),
+    ("replay_large_argument", large_argument_cost),
+    ("check_matchers", matcher_check_cost),
+    ("function_mock", function_mock_cost),
+] + [("replay_sequential_%d" % size, lambda size=size: replay_cost(size))
+     for size in SCALING_SIZES] + [
+    ("import", import_cost),
+]
+
+# Tolerances of the cases that don't take the one given to the runner.
+# Memory cases don't vary between runs, while the import, and the cases that
+# allocate the most, vary more than the others
+TOLERANCES = {
+    "expectation_footprint": 0.05,
+    "expectation_footprint_unique": 0.05,
+    "import": 0.5,
+    "replay_large_argument": 0.5,
+    "replay_sequential_1000000": 0.5,
+}
+
+# Runs per case below which results don't fail the run
+MIN_REPEAT = 3
+
+
+def run(repeat=5, names=None):
+    '''
+    Runs every benchmark, or the timed ones among names, returning their
+    results by case name
+    '''
+    results = {}
+
+    for name, case in CASES:
+        if names is None or name in names:
+            results[name] = best_of(case, repeat)
+
+    if names is not None:
+        return results
+
+    for name, case in FOOTPRINTS:
+        footprint = case()
+
+        if footprint is not None:
+            results[name] = footprint
+
+    return results
+
+
+def regressions(results, baseline, tolerance, tolerances=None):
+    '''
+    Returns (name, baseline, result) for each case whose result exceeds its
+    baseline by more than its tolerance, a fraction of the baseline, taken
+    from tolerances by case name or else tolerance. When both runs have a
+    reference case, baseline times are first scaled by the ratio between
+    the references, so that only slowdowns relative to plain Python calls
+    count
+    '''
+    tolerances = tolerances or {}
+    scale = 1.0
+
+    if REFERENCE in results and REFERENCE in baseline:
+        scale = float(results[REFERENCE]) / baseline[REFERENCE]
+
+    scaled = dict((name, value if name in UNSCALED else value * scale)
+                  for (name, value) in baseline.items() if name != REFERENCE)
+
+    return [(name, scaled[name], result)
+            for (name, result) in sorted(results.items())
+            if name in scaled and
+               result > scaled[name] * (1 + tolerances.get(name, tolerance))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks mockaccino")
+    parser.add_argument("--json", help="file to write the results to")
+    parser.add_argument("--baseline", help="results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="slowdown over the baseline, as a fraction " +
+                             "of it, above which a case regressed, for " +
+                             "the cases without one in TOLERANCES")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="runs per case, of which the fastest counts")
+    options = parser.parse_args(argv)
+
+    results = run(options.repeat)
+    failed = False
+
+    for name, result in sorted(results.items()):
+        print("%-30s %12.1f" % (name, result))
+
+    if options.json:
+        with open(options.json, "w") as output:
+            json.dump({"python": platform.python_version(),
+                       "results": results}, output, indent=2,
+                      sort_keys=True)
+            output.write("\n")
+
+    if options.baseline:
+        with open(options.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        if baseline.get("python") != platform.python_version():
+            print("Warning: the baseline was measured on Python %s" %
+                  baseline.get("python"))
+
+        regressed = regressions(results, baseline["results"],
+                                options.tolerance, TOLERANCES)
+
+        if regressed:
+            # Slow runs are mostly noise, so the regressed cases, and the
+            # reference they are scaled by, get another chance
+            again = run(options.repeat,
+                        set(name for (name, _, _) in regressed) |
+                        set([REFERENCE]))
+
+            for name, result in again.items():
+                results[name] = min(results[name], result)
+
+            regressed = regressions(results, baseline["results"],
+                                    options.tolerance, TOLERANCES)
+
+        for name, expected, result in regressed:
+            print("REGRESSION %s: %.1f, scaled baseline %.1f" %
+                  (name, result, expected))
+
+        failed = bool(regressed)
+
+    if results["import"] > IMPORT_BUDGET:
+        print("OVER BUDGET import: %.1f, budget %.1f" %
+              (results["import"], IMPORT_BUDGET))
+
+        failed = True
+
+    if failed and options.repeat < MIN_REPEAT:
+        print("Not failing on fewer than %d runs per case" % MIN_REPEAT)
+
+        return 0
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
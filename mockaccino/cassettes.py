@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright (c) 2012, Paolo Victor.
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+    OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+    NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+    HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+    WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+
+Cassettes: files holding the expectations recorded on a mock, so that they
+can be replayed by other test runs.
+
+A cassette starts with a header (the MAGIC bytes and a format version),
+followed by one record per expectation, "always" expectations first. Each
+record is a kind byte and a payload length, followed by the payload, a
+pickled tuple with the expectation's call, outcome and expected count.
+Records are pickled one by one, so that each can be read on its own, which
+is what the format is laid out for rather than for size. Loading reads the
+"always" expectations at once, while the others are unpickled from a memory
+mapped file as replay reaches them. As unpickling may run arbitrary code,
+only cassettes from trusted sources should be loaded
+'''
+
+import mmap
+import os
+import pickle
+import struct
+
+from . import _EXPORTS
+from .mocks import Expectation, create_mock
+
+__all__ = _EXPORTS["cassettes"]
+
+MAGIC = b"MKCS"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sB")
+_RECORD = struct.Struct("<BI")
+
+_ALWAYS = 0
+_SEQUENTIAL = 1
+
+
+def _dumps(expectation):
+    return pickle.dumps((expectation.method, expectation.args,
+                         expectation.kwargs, expectation.returns,
+                         expectation.to_return, expectation.to_raise,
+                         expectation._times, expectation._asynchronous,
+                         expectation._latency), 2)
+
+
+def _loads(payload):
+    (method, args, kwargs, returns, to_return, to_raise, times, asynchronous,
+     latency) = pickle.loads(payload)
+
+    expectation = Expectation(method, args, kwargs)
+    expectation.returns = returns
+    expectation.to_return = to_return
+    expectation.to_raise = to_raise
+    expectation._times = times
+    expectation._asynchronous = asynchronous
+    expectation._latency = latency
+
+    return expectation
+
+
+def save_cassette(mock, path):
+    '''
+    Writes the expectations recorded on a mock, and not yet met, to a
+    cassette file
+    '''
+    always_expected, pending = mock._recorded_expectations()
+
+    with open(path, "wb") as cassette:
+        cassette.write(_HEADER.pack(MAGIC, VERSION))
+
+        for kind, expectations in ((_ALWAYS, always_expected),
+                                   (_SEQUENTIAL, pending)):
+            for expectation in expectations:
+                payload = _dumps(expectation)
+                cassette.write(_RECORD.pack(kind, len(payload)))
+                cassette.write(payload)
+
+
+def _read_records(data, offset, path):
+    while offset < len(data):
+        if offset + _RECORD.size > len(data):
+            raise ValueError("%s is truncated" % path)
+
+        kind, length = _RECORD.unpack_from(data, offset)
+
+        if kind not in (_ALWAYS, _SEQUENTIAL):
+            raise ValueError("%s has a record of unknown kind %d at offset %d"
+                             % (path, kind, offset))
+
+        offset += _RECORD.size
+
+        if offset + length > len(data):
+            raise ValueError("%s is truncated" % path)
+
+        yield kind, offset, data[offset:offset + length]
+
+        offset += length
+
+
+def _close(cassette, data):
+    data.close()
+    cassette.close()
+
+
+def _streamed(cassette, data, offset, path):
+    try:
+        for kind, offset, payload in _read_records(data, offset, path):
+            if kind != _SEQUENTIAL:
+                raise ValueError("%s has an \"always\" record at offset %d, "
+                                 "after the others" %
+                                 (path, offset - _RECORD.size))
+
+            last = offset + len(payload) == len(data)
+
+            if last:
+                # The file isn't needed once its last record has been read
+                _close(cassette, data)
+
+            yield _loads(payload)
+
+            if last:
+                return
+    finally:
+        _close(cassette, data)
+
+
+def load_cassette(to_mock, path, **options):
+    '''
+    Returns a mock for the given class or function, created with the given
+    create_mock options, that will replay the expectations in a cassette
+    once set on replay mode. Expectations are read from the file as replay
+    reaches them, unless the mock is unordered. Cassettes are unpickled, so
+    they must come from a trusted source
+    '''
+    cassette = open(path, "rb")
+
+    try:
+        if os.fstat(cassette.fileno()).st_size < _HEADER.size:
+            # Empty files can't be memory mapped either
+            raise ValueError("%s is not a version %d cassette" %
+                             (path, VERSION))
+
+        data = mmap.mmap(cassette.fileno(), 0, access=mmap.ACCESS_READ)
+    except Exception:
+        cassette.close()
+        raise
+
+    try:
+        magic, version = _HEADER.unpack_from(data, 0)
+
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a version %d cassette" %
+                             (path, VERSION))
+
+        always_expected = []
+        offset = _HEADER.size
+
+        for kind, payload_offset, payload in _read_records(data, offset,
+                                                           path):
+            if kind != _ALWAYS:
+                break
+
+            always_expected.append(_loads(payload))
+            offset = payload_offset + len(payload)
+
+        mock = create_mock(to_mock, **options)
+    except Exception:
+        _close(cassette, data)
+        raise
+
+    if offset == len(data):
+        _close(cassette, data)
+        streamed = ()
+    else:
+        streamed = _streamed(cassette, data, offset, path)
+
+    mock._load_expectations(always_expected, streamed)
+
+    return mock
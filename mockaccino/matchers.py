@@ -1,16 +1,272 @@
 '''
-Matchers that allow more flexible value comparation on mock invocations
+Matchers that allow more flexible value comparation on mock invocations.
+
+A matcher is an instance of a Matcher subclass, which implements
+matches(value). When an expectation is recorded with matchers, each of its
+arguments is compiled into a test function (see compile_matcher), so replay
+doesn't have to find out how to compare every argument again on every call
 '''
 
+import collections
+
+
+class Matcher(object):
+    '''
+    Base class for matchers. Matchers compare equal to the values they match
+    and aren't hashable, so calls recorded with them are never told apart by
+    their fingerprints
+    '''
+    __hash__ = None
+
+    def matches(self, value):
+        raise NotImplementedError()
+
+    def __eq__(self, other):
+        return self.matches(other)
+
+    def __ne__(self, other):
+        return not self.matches(other)
+
+
+def compile_matcher(expected):
+    '''
+    Returns a function that tells whether a value matches expected, which may
+    be a matcher or a value the argument should be equal to
+    '''
+    if isinstance(expected, Matcher):
+        return expected.matches
+
+    return lambda value: expected == value
+
+
+class AnyMatcher(Matcher):
+    def __init__(self, cls):
+        self.cls = cls
+
+    def matches(self, value):
+        return isinstance(value, self.cls)
+
+    def __repr__(self):
+        return "any(%s)" % getattr(self.cls, "__name__", self.cls)
+
+
+class PredicateMatcher(Matcher):
+    def __init__(self, predicate):
+        self.predicate = predicate
+
+    def matches(self, value):
+        return bool(self.predicate(value))
+
+    def __repr__(self):
+        return "that(%r)" % self.predicate
+
+
+class RegexMatcher(Matcher):
+    def __init__(self, pattern, flags=0):
+        # Imported here, as it would take longer than the rest of mockaccino
+        import re
+
+        self.pattern = re.compile(pattern, flags)
+
+    def matches(self, value):
+        try:
+            return self.pattern.search(value) is not None
+        except TypeError:
+            return False
+
+    def __repr__(self):
+        return "regex(%r)" % self.pattern.pattern
+
+
+class RangeMatcher(Matcher):
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+
+    def matches(self, value):
+        try:
+            return self.low <= value <= self.high
+        except TypeError:
+            return False
+
+    def __repr__(self):
+        return "between(%r, %r)" % (self.low, self.high)
+
+
+class ContainsMatcher(Matcher):
+    def __init__(self, item):
+        self.item = item
+
+    def matches(self, value):
+        try:
+            return self.item in value
+        except TypeError:
+            return False
+
+    def __repr__(self):
+        return "contains(%r)" % (self.item,)
+
+
+class AnyOfMatcher(Matcher):
+    def __init__(self, alternatives):
+        self.alternatives = alternatives
+        self.__tests = [compile_matcher(a) for a in alternatives]
+
+    def matches(self, value):
+        for test in self.__tests:
+            if test(value):
+                return True
+
+        return False
+
+    def __repr__(self):
+        return "any_of(%s)" % ", ".join(repr(a) for a in self.alternatives)
+
+
+class ShapeMatcher(Matcher):
+    def __init__(self, expected):
+        self.expected = expected
+        self.__test = self.__compile(expected)
+
+    def __compile(self, expected):
+        if isinstance(expected, dict):
+            tests = dict((k, self.__compile(v)) for (k, v) in expected.items())
+
+            def test(value):
+                if not isinstance(value, dict) or len(value) != len(tests):
+                    return False
+
+                for key, item in value.items():
+                    item_test = tests.get(key)
+
+                    if item_test is None or not item_test(item):
+                        return False
+
+                return True
+        elif isinstance(expected, (list, tuple)):
+            sequence_type = type(expected)
+            tests = [self.__compile(e) for e in expected]
+
+            def test(value):
+                if (not isinstance(value, sequence_type) or
+                    len(value) != len(tests)):
+                    return False
+
+                for item_test, item in zip(tests, value):
+                    if not item_test(item):
+                        return False
+
+                return True
+        else:
+            test = compile_matcher(expected)
+
+        return test
+
+    def matches(self, value):
+        return self.__test(value)
+
+    def __repr__(self):
+        return "shape(%r)" % (self.expected,)
+
+
+class Captor(Matcher):
+    '''
+    Matches any value, and is given the values passed in the calls that met
+    its expectation. They are kept in a ring buffer holding the last
+    "capacity" values, every one of them if capacity is None, or passed to
+    on_capture instead, if it was given
+    '''
+    # Values kept by default, so that an "always" expectation doesn't keep
+    # every value it was called with
+    CAPACITY = 1000
+
+    def __init__(self, capacity=CAPACITY, on_capture=None):
+        self.values = collections.deque(maxlen=capacity)
+        self.on_capture = on_capture
+        self.count = 0
+
+    def matches(self, value):
+        return True
+
+    def capture(self, value):
+        self.count += 1
+
+        if self.on_capture is None:
+            self.values.append(value)
+        else:
+            self.on_capture(value)
+
+    @property
+    def value(self):
+        '''
+        The last captured value
+        '''
+        if not self.values:
+            raise ValueError("No value was captured")
+
+        return self.values[-1]
+
+    def __repr__(self):
+        return "captor()"
+
+
 def any(type_to_match):
     '''
     Returns a matcher that will match two values when they are of the same type
     '''
-    class AnyMatcher(object):
-        def __init__(self, cls):
-            self.cls = cls
+    return AnyMatcher(type_to_match)
 
-        def __eq__(self, other):
-            return isinstance(other, self.cls)
 
-    return AnyMatcher(type_to_match)
+def that(predicate):
+    '''
+    Returns a matcher for the values for which predicate returns True
+    '''
+    return PredicateMatcher(predicate)
+
+
+def regex(pattern, flags=0):
+    '''
+    Returns a matcher for the strings in which the regular expression pattern
+    is found
+    '''
+    return RegexMatcher(pattern, flags)
+
+
+def between(low, high):
+    '''
+    Returns a matcher for the values from low to high, both included
+    '''
+    return RangeMatcher(low, high)
+
+
+def contains(item):
+    '''
+    Returns a matcher for the containers that hold item
+    '''
+    return ContainsMatcher(item)
+
+
+def any_of(*alternatives):
+    '''
+    Returns a matcher for the values that match any of the alternatives,
+    which may be values or matchers
+    '''
+    return AnyOfMatcher(alternatives)
+
+
+def shape(expected):
+    '''
+    Returns a matcher for nested dicts, lists and tuples with the same keys
+    and lengths as expected, whose items match the ones in expected, which
+    may be values or matchers
+    '''
+    return ShapeMatcher(expected)
+
+
+def captor(capacity=Captor.CAPACITY, on_capture=None):
+    '''
+    Returns a matcher that matches any value and captures it, keeping the
+    last capacity values (all of them if capacity is None), or passing each
+    of them to on_capture
+    '''
+    return Captor(capacity, on_capture)
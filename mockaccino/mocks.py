@@ -24,26 +24,179 @@ conditions:
     OTHER DEALINGS IN THE SOFTWARE.
 '''
 
-import inspect
+import collections
+import heapq
+import itertools
+import operator
+import threading
+import weakref
 
+try:
+    import reprlib
+except ImportError:
+    # Python 2
+    import repr as reprlib
 
-def create_mock(to_mock):
+from . import _EXPORTS
+from .matchers import Captor, Matcher, compile_matcher
+from .timing import Fixed, default_clock
+
+__all__ = _EXPORTS["mocks"]
+
+
+BlueprintCacheInfo = collections.namedtuple("BlueprintCacheInfo",
+                                            "hits misses size")
+
+_Blueprint = collections.namedtuple("_Blueprint",
+                                    "mock_class special_methods")
+
+
+def _asyncio():
+    '''
+    Returns the asyncio module, or None if it isn't available. It's only
+    imported when needed, as it takes longer to import than all of mockaccino
+    '''
+    try:
+        import asyncio
+    except ImportError:
+        return None
+
+    return asyncio
+
+
+def _running_loop():
+    '''
+    Returns the event loop running the current coroutine
+    '''
+    asyncio = _asyncio()
+
+    # get_running_loop is missing before Python 3.7, where get_event_loop
+    # returns the running loop, if any
+    return getattr(asyncio, "get_running_loop", asyncio.get_event_loop)()
+
+
+def _inspect():
+    '''
+    Returns the inspect module. It's only imported once a mock is created, as
+    it takes longer to import than all of mockaccino
+    '''
+    import inspect
+
+    return inspect
+
+
+def _iscoroutinefunction(function):
+    # inspect.iscoroutinefunction is missing from interpreters without asyncio
+    iscoroutinefunction = getattr(_inspect(), "iscoroutinefunction", None)
+
+    return iscoroutinefunction is not None and iscoroutinefunction(function)
+
+
+def _is_method(member):
+    # Methods are plain functions when looked up on a class on Python 3
+    inspect = _inspect()
+
+    return inspect.ismethod(member) or inspect.isfunction(member)
+
+
+def _is_special(name):
+    return name.startswith("__") and name.endswith("__")
+
+
+def _build_blueprint(cls):
+    '''
+    Generates the Mock subclass used for every mock of cls. Regular methods
+    become lazy descriptors on the subclass; special methods are still set on
+    each instance, as defining them on the class would change how the mock
+    itself behaves
+    '''
+    members = [(n, a) for (n, a) in _inspect().getmembers(cls)
+               if _is_method(a)]
+    names = [n for (n, a) in members]
+
+    attributes = dict((n, _LazyMockMethod(n, _iscoroutinefunction(a)))
+                      for (n, a) in members if not _is_special(n))
+    mock_class = type(cls.__name__ + "Mock", (Mock,), attributes)
+
+    return _Blueprint(mock_class, tuple(n for n in names if _is_special(n)))
+
+
+class _BlueprintCache(object):
+    '''
+    Keeps, for each mocked class, the blueprint its mocks are created from,
+    so that mocking the same class again skips introspection. Classes
+    are weakly referenced: a redefined class is a new key and the stale entry
+    goes away with the old class
+    '''
+    def __init__(self):
+        self.__blueprints = weakref.WeakKeyDictionary()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, cls):
+        blueprint = self.__blueprints.get(cls)
+
+        if blueprint is None:
+            self.misses += 1
+            blueprint = self.__blueprints[cls] = _build_blueprint(cls)
+        else:
+            self.hits += 1
+
+        return blueprint
+
+    def info(self):
+        return BlueprintCacheInfo(self.hits, self.misses,
+                                  len(self.__blueprints))
+
+    def clear(self):
+        self.__blueprints.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+_blueprint_cache = _BlueprintCache()
+
+
+def blueprint_cache_info():
+    '''
+    Returns the hits, misses and current size of the cache of mocked class
+    blueprints used by create_mock
+    '''
+    return _blueprint_cache.info()
+
+
+def clear_blueprint_cache():
+    '''
+    Empties the blueprint cache and resets its counters. Needed only if a
+    class has methods added or removed after it was first mocked
+    '''
+    _blueprint_cache.clear()
+
+
+def create_mock(to_mock, ordered=True, thread_safe=False, clock=None):
     '''
     Returns a mock object for the given class. The returned mock is on record
-    mode by default
+    mode by default. If ordered is False, recorded calls may be replayed in
+    any order. Thread safe mocks may be shared by several threads. Simulated
+    latencies are waited for on the given clock (see mockaccino.timing)
     '''
-    mock = Mock()
+    inspect = _inspect()
 
     if inspect.isclass(to_mock):
-        for n, a in [(n, a) for (n, a) in inspect.getmembers(to_mock)\
-                                       if inspect.ismethod(a)]:
+        blueprint = _blueprint_cache.get(to_mock)
+        mock = blueprint.mock_class(ordered, thread_safe, clock)
+
+        for n in blueprint.special_methods:
             try:
                 setattr(mock, n, MockMethod(n, mock))
             except AttributeError:
                 # Read-only methods are not mocked
                 pass
     elif inspect.isfunction(to_mock):
-        setattr(mock, '_called_as_function', MockMethod(to_mock.__name__, mock))
+        mock = Mock(ordered, thread_safe, clock)
+        setattr(mock, '_called_as_function',
+                MockMethod(to_mock.__name__, mock,
+                           _iscoroutinefunction(to_mock)))
     else:
         raise ValueError("Only classes or functions may be mocked")
 
@@ -59,26 +212,476 @@ def replay(*args):
         mock.enter_replay_mode()
 
 
+def clone(mock):
+    '''
+    Returns a new mock on replay mode that expects the calls recorded on mock,
+    which must be on replay mode. Recorded expectations are shared rather
+    than copied, so a mock may be recorded once and cloned for each test;
+    every clone keeps track of the calls met on it by itself
+    '''
+    return mock._clone()
+
+
+def reset(*args):
+    '''
+    Rewinds the specified mocks, which must be on replay mode, so that all
+    the calls recorded on them are expected again
+    '''
+    for mock in args:
+        mock._reset()
+
+
+try:
+    _VALUE_TYPES = frozenset((bool, int, long, float, complex, str, unicode,
+                              type(None)))
+except NameError:
+    _VALUE_TYPES = frozenset((bool, int, float, complex, str, bytes,
+                              type(None)))
+
+# Types of the recorded arguments that are interned. Floats are left out,
+# as 0.0 and -0.0 are equal, and hash the same, yet print differently
+_INTERNED_TYPES = _VALUE_TYPES - frozenset((float, complex))
+
+# Number of distinct arguments interned while recording, so that calls with
+# unique arguments don't fill the table with ones that are never shared
+_INTERNED_MAX = 1024
+
+
+# Number of items in tuples that are walked to fingerprint a call. Larger
+# arguments are compared with ==, which is faster than walking them in Python
+_FROZEN_BUDGET = 64
+
+
+class _NotFingerprintable(Exception):
+    pass
+
+
+def _frozen(value, budget=_FROZEN_BUDGET):
+    '''
+    Checks that the hash of value is known to agree with its equality, raising
+    _NotFingerprintable otherwise. Mutable containers are refused, since they
+    may change between recording and replay, and so are tuples holding more
+    than budget items in all. Returns the budget left
+    '''
+    value_type = type(value)
+
+    if value_type in _VALUE_TYPES or value_type is frozenset:
+        return budget
+    elif value_type is tuple:
+        budget -= len(value)
+
+        if budget < 0:
+            raise _NotFingerprintable()
+
+        for item in value:
+            budget = _frozen(item, budget)
+
+        return budget
+
+    raise _NotFingerprintable()
+
+
+def _same_value(a, b):
+    '''
+    Tells whether a and b are the same object, or equal immutable values
+    '''
+    if a is b:
+        return True
+
+    try:
+        _frozen(a)
+    except _NotFingerprintable:
+        return False
+
+    return type(a) is type(b) and a == b
+
+
+def _hashable(args, kwargs):
+    '''
+    Tells whether a call can be fingerprinted: its arguments can't if some
+    of them can't be hashed reliably, matchers included, or are too large
+    for it to be worth it
+    '''
+    budget = _FROZEN_BUDGET
+
+    try:
+        # Plain values, by far the most common arguments, are checked inline
+        for value in args:
+            if type(value) not in _VALUE_TYPES:
+                budget = _frozen(value, budget)
+
+        for value in kwargs.values():
+            if type(value) not in _VALUE_TYPES:
+                budget = _frozen(value, budget)
+    except _NotFingerprintable:
+        return False
+
+    return True
+
+
+def _fingerprint(method, args, kwargs):
+    '''
+    Returns a hash of a call that is equal for any two equal calls, or None
+    if the call can't be fingerprinted
+    '''
+    if not _hashable(args, kwargs):
+        return None
+    elif not kwargs:
+        return hash((method, args))
+
+    return hash((method, args, frozenset(kwargs.items())))
+
+
+# The search for the pending expectations closest to an unexpected call looks
+# at a bounded number of them, so that it stays quick on very long scripts
+_NEAREST_SCANNED = 10000
+_NEAREST_REPORTED = 3
+# Items in a container argument beyond which it's only taken as equal to
+# the same object, so that scoring candidates doesn't walk large arguments
+_NEAREST_ITEMS = 100
+
+
+def _equal(expected, value):
+    if expected is value:
+        return True
+
+    for argument in (expected, value):
+        if type(argument) in _VALUE_TYPES:
+            continue
+
+        try:
+            if len(argument) > _NEAREST_ITEMS:
+                return False
+        except Exception:
+            pass
+
+    try:
+        return bool(expected == value)
+    except Exception:
+        return False
+
+
+def _similarity(expectation, args, kwargs):
+    '''
+    Returns the fraction of a call's arguments, from 0 to 1, that are equal
+    to the ones expectation was recorded with
+    '''
+    matched = 0
+
+    for expected, value in zip(expectation.args, args):
+        if _equal(expected, value):
+            matched += 1
+
+    for key, value in kwargs.items():
+        if (key in expectation.kwargs and
+            _equal(expectation.kwargs[key], value)):
+            matched += 1
+
+    total = max(len(expectation.args), len(args)) + \
+            len(set(expectation.kwargs) | set(kwargs))
+
+    return float(matched) / total if total else 1.0
+
+
+def _nearest(candidates, args, kwargs):
+    '''
+    Returns the expectations closest to a call out of the first candidates,
+    which are expectations for the called method, the closest one first.
+    Queues hand it to UnexpectedCallError to be called only if needed
+    '''
+    scored = [(_similarity(e, args, kwargs), e)
+              for e in itertools.islice(candidates, _NEAREST_SCANNED)]
+
+    return [e for (score, e) in heapq.nlargest(_NEAREST_REPORTED, scored,
+                                               key=lambda pair: pair[0])]
+
+
+def _nearest_in_line(following, method, args, kwargs):
+    '''
+    Returns a function that finds the expectations for method closest to a
+    call, out of the first of following, the expectations next in line of an
+    ordered queue, as they are now
+    '''
+    following = list(itertools.islice(following, _NEAREST_SCANNED))
+
+    return lambda: _nearest((e for e in following if e.method == method),
+                            args, kwargs)
+
+
+def stream(mock, expectations):
+    '''
+    Makes a mock pull expectations from an iterable, such as a generator, as
+    replay reaches them, after the recorded ones are used up. Only the
+    expectation being met is kept, so unbounded streams use constant memory.
+    Only ordered mocks may stream, as an unordered one would need the whole
+    iterable to know which expectation a call meets
+    '''
+    mock._stream(expectations)
+
+
+def record_all(mock, calls):
+    '''
+    Records many expectations on a mock at once. Each call is a (method,
+    args, kwargs, outcome, times) tuple: outcome is the value to return, or
+    an Exception instance to raise, and times may be None (once), a positive
+    number or Expectation.ALWAYS. The whole batch is validated before it is
+    recorded, so that it is either recorded entirely or not at all
+    '''
+    mock._record_all(calls)
+
+
+class _ShortRepr(reprlib.Repr):
+    '''
+    Repr that renders the first items of dicts and sets in iteration order,
+    instead of sorting all of them first
+    '''
+    def repr_dict(self, x, level):
+        if not x:
+            return "{}"
+        elif level <= 0:
+            return "{...}"
+
+        items = getattr(x, "iteritems", x.items)()
+        pieces = ["%s: %s" % (self.repr1(k, level - 1),
+                              self.repr1(v, level - 1))
+                  for (k, v) in itertools.islice(items, self.maxdict)]
+
+        if len(x) > self.maxdict:
+            pieces.append("...")
+
+        return "{%s}" % ", ".join(pieces)
+
+    def repr_set(self, x, level):
+        if not x:
+            return "%s()" % type(x).__name__
+        elif level <= 0:
+            return "%s({...})" % type(x).__name__
+
+        pieces = [self.repr1(item, level - 1)
+                  for item in itertools.islice(x, self.maxset)]
+
+        if len(x) > self.maxset:
+            pieces.append("...")
+
+        return "%s({%s})" % (type(x).__name__, ", ".join(pieces))
+
+    repr_frozenset = repr_set
+
+
+# Arguments in error messages are shortened, so that large payloads don't
+# make them slow to render and hard to read
+_short = _ShortRepr()
+_short.maxstring = _short.maxother = 60
+_short.maxlist = _short.maxtuple = _short.maxdict = _short.maxset = 6
+_short.maxlevel = 3
+
+_MAX_DIFFERENCES = 10
+# Items of each dict, list or tuple looked into for differences
+_MAX_DIFFERENCE_ITEMS = 100
+_MAX_MESSAGE = 4000
+
+_MISSING = object()
+
+
+def _render_value(value):
+    return "nothing" if value is _MISSING else _short.repr(value)
+
+
+def _is_call(value):
+    return (isinstance(value, tuple) and len(value) == 3 and
+            isinstance(value[1], tuple) and isinstance(value[2], dict))
+
+
+def _render_call(call):
+    if not _is_call(call):
+        # Calls given to UnexpectedCallError by hand may be anything
+        return _short.repr(call)
+
+    method, args, kwargs = call
+    arguments = [_short.repr(a) for a in args] + \
+                ["%s=%s" % (k, _short.repr(v)) for (k, v) in
+                 sorted(kwargs.items(), key=lambda item: item[0])]
+
+    return "%s(%s)" % (method, ", ".join(arguments))
+
+
+def _differences(place, expected, got, depth=3):
+    '''
+    Yields the (place, expected, got) parts of two values that differ,
+    looking into dicts, and into lists and tuples of the same length. Only
+    their first items are looked into; if those don't differ, the values
+    are yielded whole
+    '''
+    if expected is not _MISSING and got is not _MISSING and \
+       _equal(expected, got):
+        return
+
+    found = False
+
+    if depth and type(expected) is type(got):
+        if isinstance(expected, dict):
+            keys = set(itertools.islice(expected, _MAX_DIFFERENCE_ITEMS)) | \
+                   set(itertools.islice(got, _MAX_DIFFERENCE_ITEMS))
+
+            for key in sorted(keys, key=_short.repr):
+                for difference in _differences(
+                        "%s[%s]" % (place, _short.repr(key)),
+                        expected.get(key, _MISSING), got.get(key, _MISSING),
+                        depth - 1):
+                    found = True
+                    yield difference
+        elif (isinstance(expected, (list, tuple)) and
+              len(expected) == len(got)):
+            pairs = zip(itertools.islice(expected, _MAX_DIFFERENCE_ITEMS),
+                        itertools.islice(got, _MAX_DIFFERENCE_ITEMS))
+
+            for i, (e, g) in enumerate(pairs):
+                for difference in _differences("%s[%d]" % (place, i), e, g,
+                                               depth - 1):
+                    found = True
+                    yield difference
+
+    if not found:
+        yield (place, expected, got)
+
+
+def _call_differences(expected, got):
+    (expected_method, expected_args, expected_kwargs) = expected
+    (method, args, kwargs) = got
+
+    if expected_method != method:
+        yield ("method", expected_method, method)
+
+    for i in range(max(len(expected_args), len(args))):
+        for difference in _differences(
+                "args[%d]" % i,
+                expected_args[i] if i < len(expected_args) else _MISSING,
+                args[i] if i < len(args) else _MISSING):
+            yield difference
+
+    for key in sorted(set(expected_kwargs) | set(kwargs)):
+        for difference in _differences("kwargs[%r]" % key,
+                                       expected_kwargs.get(key, _MISSING),
+                                       kwargs.get(key, _MISSING)):
+            yield difference
+
+
 class UnexpectedCallError(Exception):
     '''
-    Exception thrown when an unexpected call is invoked on a moc
+    Exception thrown when an unexpected call is invoked on a mock. The
+    expected and actual calls are kept, whole, as (method, args, kwargs)
+    tuples; the message is only rendered when asked for, with long
+    arguments shortened and the differing ones pointed out
     '''
-    def __init__(self, expected=None, got=None, message=None):
-        super(Exception, message)
+    def __init__(self, expected=None, got=None, message=None,
+                 candidates=None):
+        super(UnexpectedCallError, self).__init__(expected, got, message)
         self.expected = expected
         self.got = got
+        self.message = message
+        self.candidates = candidates
+        self.__rendered = None
+
+    @property
+    def candidates(self):
+        '''
+        Pending expectations for the called method closest to the call. They
+        may be given as a function, which is only called once they are used,
+        as finding them compares the call with many expectations
+        '''
+        if callable(self.__candidates):
+            self.__candidates = self.__candidates()
+
+        return self.__candidates
+
+    @candidates.setter
+    def candidates(self, candidates):
+        self.__candidates = candidates if candidates is not None else []
 
     def __str__(self):
-        return "Expected %s, got %s" % (self.expected, self.got)
+        if self.__rendered is None:
+            self.__rendered = self.__render()
+
+        return self.__rendered
+
+    def __repr__(self):
+        return "UnexpectedCallError(%s)" % _short.repr(str(self))
+
+    def __render(self):
+        lines = []
+        message = self.message
+
+        if self.expected is not None and not _is_call(self.expected):
+            # As in UnexpectedCallError("text")
+            message = "%s" % (self.expected,)
+
+        if _is_call(self.expected) and self.got is None:
+            lines.append("Expected %s" % _render_call(self.expected))
+        elif _is_call(self.expected):
+            lines.append("Expected %s, got %s" %
+                         (_render_call(self.expected),
+                          _render_call(self.got)))
+
+            if _is_call(self.got):
+                lines.extend(self.__differences())
+        elif self.got is not None:
+            lines.append("%s, got %s" % (message or "Unexpected call",
+                                         _render_call(self.got)))
+        else:
+            lines.append(message or "Unexpected call")
+
+        if self.candidates:
+            lines.append("Closest pending calls:")
+            lines.extend("  " + _render_call((e.method, e.args, e.kwargs))
+                         for e in self.candidates)
+
+        message = "\n".join(lines)
+
+        if len(message) > _MAX_MESSAGE:
+            message = message[:_MAX_MESSAGE] + " ... (truncated)"
+
+        return message
 
 
+    def __differences(self):
+        differences = list(itertools.islice(
+                _call_differences(self.expected, self.got),
+                _MAX_DIFFERENCES + 1))
+        lines = []
+
+        if differences:
+            lines.append("Differences:")
+            lines.extend("  %s: expected %s, got %s" %
+                         (place, _render_value(e), _render_value(g))
+                         for (place, e, g) in differences[:_MAX_DIFFERENCES])
+
+        if len(differences) > _MAX_DIFFERENCES:
+            lines.append("  ...")
+
+        return lines
+
 class Expectation(object):
     '''
     Represents an expectation about a method invocation
     '''
     ALWAYS = -1
 
+    # Slots keep expectations small when millions of them are recorded
+    __slots__ = ("method", "args", "kwargs", "returns", "to_return",
+                 "to_raise", "_times", "_asynchronous", "_latency",
+                 "_hashable", "_plan", "_settled")
+
     def __init__(self, method, args=None, kwargs=None):
+        args = args if args is not None else ()
+        kwargs = kwargs if kwargs is not None else {}
+
+        self._initialize(method, args, kwargs, _hashable(args, kwargs))
+
+    def _initialize(self, method, args, kwargs, hashable):
+        '''
+        Sets every slot, given whether the call can be fingerprinted. Used by
+        the constructor, and by record_all, which tells faster for a batch
+        '''
         self.method = method
         self.args = args
         self.kwargs = kwargs
@@ -86,19 +689,148 @@ class Expectation(object):
         self.to_return = None
         self.to_raise = None
         self._times = 0
+        self._asynchronous = False
+        self._latency = None
+        self._hashable = hashable
+        self._plan = None
+        # False while the outcome is yet to be set, as by a recorder waiting
+        # for a real coroutine to finish
+        self._settled = True
 
-    def count_down(self):
-        self._times -= 1
+        if not hashable:
+            self.__compile_plan()
+
+    @property
+    def _fingerprint(self):
+        '''
+        Hash of the recorded call, or None if it can't be fingerprinted. It's
+        worked out when asked for, by the indexes of unordered mocks, rather
+        than kept by every expectation
+        '''
+        if not self._hashable:
+            return None
+        elif not self.kwargs:
+            return hash((self.method, self.args))
+
+        return hash((self.method, self.args,
+                     frozenset(self.kwargs.items())))
+
+    def __compile_plan(self):
+        '''
+        Compiles arguments recorded with matchers into one test per argument
+        '''
+        values = list(self.args) + list(self.kwargs.values())
+
+        if not [v for v in values if isinstance(v, Matcher)]:
+            return
+
+        # Captors are given the values of the calls that meet the expectation
+        captors = [(i, a) for (i, a) in enumerate(self.args)
+                          if isinstance(a, Captor)] + \
+                  [(k, v) for (k, v) in self.kwargs.items()
+                          if isinstance(v, Captor)]
+
+        self._plan = (tuple(compile_matcher(a) for a in self.args),
+                      dict((k, compile_matcher(v))
+                           for (k, v) in self.kwargs.items()),
+                      captors)
+
+    def _capture(self, args, kwargs):
+        for position, captor in self._plan[2]:
+            if isinstance(position, int):
+                captor.capture(args[position])
+            else:
+                captor.capture(kwargs[position])
+
+    def matches(self, method, args, kwargs):
+        '''
+        Tells whether a call matches this expectation. Arguments recorded
+        with matchers are checked by their compiled tests, and others are
+        compared with ==, which checks identity first. Calls aren't
+        fingerprinted here: the indexes of unordered mocks only compare
+        calls to expectations with the same fingerprint
+        '''
+        if self.method != method:
+            return False
+
+        if self._plan is not None:
+            return self.__follow_plan(args, kwargs)
+
+        return self.args == args and self.kwargs == kwargs
+
+    def __follow_plan(self, args, kwargs):
+        arg_tests, kwarg_tests, captors = self._plan
+
+        if len(args) != len(arg_tests) or len(kwargs) != len(kwarg_tests):
+            return False
+
+        for test, value in zip(arg_tests, args):
+            if not test(value):
+                return False
+
+        for key, value in kwargs.items():
+            test = kwarg_tests.get(key)
+
+            if test is None or not test(value):
+                return False
+
+        return True
 
     def check(self, method, args, kwargs):
-        if (self.method != method or self.args != args or
-            self.kwargs != kwargs):
+        '''
+        Raises UnexpectedCallError unless the call matches this expectation.
+        Used by ordered mocks and "always" modifiers, which only compare the
+        call to one expectation: fingerprinting it would cost as much as
+        comparing it, so its arguments are compared with ==
+        '''
+        if not self.matches(method, args, kwargs):
             raise UnexpectedCallError((self.method, self.args, self.kwargs),
                     (method, args, kwargs))
 
+    def count_down(self):
+        '''
+        Counts a call off this expectation. Mocks don't use it, as they keep
+        the calls left for each expectation themselves, so that clones may
+        share it
+        '''
+        self._times -= 1
+
     def depleted(self):
         return self._times <= 0
 
+    def _count(self):
+        # Expectations recorded without times() are expected once
+        return max(self._times, 1)
+
+    def _with_count(self, count):
+        '''
+        Returns a copy of this expectation, expecting count calls
+        '''
+        copy = object.__new__(Expectation)
+
+        for name in Expectation.__slots__:
+            setattr(copy, name, getattr(self, name))
+
+        copy._times = count
+
+        return copy
+
+    def _repeats(self, other):
+        '''
+        Tells whether other expects the same call as this one, with the same
+        outcome, so that both may be merged into a single expectation.
+        Outcomes that aren't settled yet may still turn out different
+        '''
+        return (self._settled and other._settled and
+                self._hashable and other._hashable and
+                self.method == other.method and self.args == other.args and
+                self.kwargs == other.kwargs and
+                self.returns == other.returns and
+                _same_value(self.to_return, other.to_return) and
+                self.to_raise is other.to_raise and
+                self._asynchronous == other._asynchronous and
+                self._latency == other._latency)
+
     def outcome(self):
         if self.to_raise:
             raise self.to_raise
@@ -131,43 +863,534 @@ class Expectation(object):
     def always(self):
         self._times = Expectation.ALWAYS
 
+    def asynchronous(self):
+        '''
+        Makes the call return an awaitable for its outcome, as coroutine
+        methods already do
+        '''
+        if _asyncio() is None:
+            raise ValueError("Asynchronous outcomes require asyncio")
+
+        self._asynchronous = True
+        return self
+
+    def will_take(self, ms=None, profile=None):
+        '''
+        Makes the call take the given number of milliseconds, or a latency
+        sampled from a profile (see mockaccino.timing). Awaitable outcomes
+        take it without blocking the event loop
+        '''
+        if (ms is None) == (profile is None):
+            raise ValueError("Either a latency or a profile must be given")
+
+        self._latency = profile or Fixed(ms)
+        return self
+
+    def latency(self):
+        '''
+        Returns a latency for a call, in seconds
+        '''
+        return self._latency.sample() / 1000.0 if self._latency else 0
+
+
+def _bulk_expectations(calls, methods):
+    '''
+    Returns the expectations for calls described as record_all takes them,
+    raising ValueError if any is invalid or is not for one of methods, a set
+    of names. Calls with plain argument values, by far the most common, are
+    told to be hashable inline rather than by Expectation's constructor
+    '''
+    expectations = []
+    append = expectations.append
+    new = object.__new__
+    value_types = _VALUE_TYPES
+
+    for method, args, kwargs, outcome, times in calls:
+        if method not in methods:
+            raise ValueError("%r is not a mocked method" % (method,))
+
+        if times is None:
+            times = 0
+        elif times != Expectation.ALWAYS and not times > 0:
+            raise ValueError("Number of times must be greater than zero")
+
+        if isinstance(outcome, type) and issubclass(outcome, Exception):
+            raise ValueError("Errors to raise should be Exception " +
+                             "instances, not classes")
+
+        args = tuple(args) if args else ()
+        kwargs = dict(kwargs) if kwargs else {}
+        expectation = new(Expectation)
+
+        for value in args:
+            if type(value) not in value_types:
+                expectation._initialize(method, args, kwargs,
+                                        _hashable(args, kwargs))
+                break
+        else:
+            expectation._initialize(method, args, kwargs,
+                                    not kwargs or _hashable(args, kwargs))
+
+        if isinstance(outcome, Exception):
+            expectation.to_raise = outcome
+        elif outcome is not None:
+            expectation.returns = True
+            expectation.to_return = outcome
+
+        expectation._times = times
+        append(expectation)
+
+    return expectations
+
+
+class _AwaitableOutcome(object):
+    '''
+    Returned by calls to coroutine methods. The expectation's outcome is
+    resolved on the running event loop once its latency has elapsed
+    '''
+    def __init__(self, expectation, clock):
+        self.__expectation = expectation
+        self.__clock = clock
+
+    def __await__(self):
+        loop = _running_loop()
+        future = loop.create_future()
+        latency = self.__expectation.latency()
+
+        if latency:
+            self.__clock.call_later(loop, latency, self.__resolve, future)
+        else:
+            self.__resolve(future)
+
+        return future.__await__()
+
+    # Allows generator based coroutines to "yield from" the outcome
+    __iter__ = __await__
+
+    def __resolve(self, future):
+        if future.cancelled():
+            return
+
+        try:
+            future.set_result(self.__expectation.outcome())
+        except Exception as error:
+            future.set_exception(error)
+
 class MockMethod(object):
     '''
     Class used to override a mocked class' methods
     '''
-    def __init__(self, name, parent):
+    __slots__ = ("name", "coroutine", "__parent")
+
+    def __init__(self, name, parent, coroutine=False):
         self.name = name
+        self.coroutine = coroutine
         self.__parent = parent
 
     def __call__(self, *args, **kwargs):
         return self.__parent._invoked(self, args, kwargs)
 
 
-class Mock(object):
+class _LazyMockMethod(object):
+    '''
+    Descriptor placed on generated Mock subclasses. The MockMethod is only
+    created when the method is first accessed on a mock, and is then cached
+    on the instance, which shadows the descriptor from there on
+    '''
+    def __init__(self, name, coroutine):
+        self.name = name
+        self.coroutine = coroutine
+
+    def __get__(self, mock, owner):
+        if mock is None:
+            return self
+
+        method = mock.__dict__[self.name] = MockMethod(self.name, mock,
+                                                       self.coroutine)
+
+        return method
+
+
+class _SequentialExpectations(object):
+    '''
+    Pending expectations that must be met in the order they were recorded.
+    Expectations are not changed on replay: the calls left for each of them
+    are counted here, so that clones of a mock may share them
+    '''
+    def __init__(self, expectations=None):
+        # Every expectation recorded, from which the pending ones are queued
+        # again when rewound. Clones share it. Any mock may be reset or
+        # cloned, so only streaming ones let go of it
+        self.__recorded = expectations if expectations is not None else []
+        # Expectations yet to be met, in order. Met ones are dropped, so
+        # they're only kept alive by the recorded ones
+        self.__pending = collections.deque(self.__recorded)
+        # Calls left for the first pending expectation, once it was first met
+        self.__remaining = None
+        # Number of pending expectations for each method name
+        self.__counts = {}
+        # Iterator from which expectations are pulled, one at a time, once
+        # the recorded ones are used up
+        self.__source = None
+
+    def __contains__(self, method_name):
+        return method_name in self.__counts
+
+    def append(self, expectation):
+        if self.__recorded is not None:
+            self.__recorded.append(expectation)
+
+        self.__pending.append(expectation)
+        self.__counts[expectation.method] = \
+                self.__counts.get(expectation.method, 0) + 1
+
+    def extend(self, expectations):
+        if self.__recorded is not None:
+            self.__recorded.extend(expectations)
+
+        self.__pending.extend(expectations)
+
+        for method, count in collections.Counter(
+                map(_method_name, expectations)).items():
+            self.__counts[method] = self.__counts.get(method, 0) + count
+
+    def attach(self, source):
+        self.__source = iter(source)
+        # Pulled expectations are dropped once met, so the queue can't be
+        # rewound, and the recorded ones aren't needed past replay either
+        self.__recorded = None
+
+    def pending(self):
+        '''
+        Returns the pending recorded expectations, in order. Those not yet
+        pulled from an attached source are not included
+        '''
+        pending = list(self.__pending)
+
+        if self.__remaining is not None:
+            pending[0] = pending[0]._with_count(self.__remaining)
+
+        return pending
+
+    def clone(self):
+        '''
+        Returns a queue sharing this one's recorded expectations, with all of
+        them pending
+        '''
+        self.__check_rewindable()
+
+        clone = _SequentialExpectations(self.__recorded)
+        clone.rewind()
+
+        return clone
+
+    def rewind(self):
+        self.__check_rewindable()
+
+        self.__pending = collections.deque(self.__recorded)
+        self.__remaining = None
+        self.__counts = {}
+
+        for expectation in self.__recorded:
+            self.__counts[expectation.method] = \
+                    self.__counts.get(expectation.method, 0) + 1
+
+    def __check_rewindable(self):
+        if self.__recorded is None:
+            raise ValueError("Streamed expectations can't be replayed again")
+
+    def nearest(self, method, args, kwargs):
+        '''
+        Returns a function that finds the pending expectations for method
+        closest to a call, out of the ones next in line now. Expectations
+        further back in the queue are not looked at
+        '''
+        return _nearest_in_line(self.__pending, method, args, kwargs)
+
+    def __pull(self):
+        for expectation in self.__source or ():
+            # Only the expectation being met is kept, so memory use doesn't
+            # grow with the length of the source
+            self.append(expectation)
+
+            return True
+
+        self.__source = None
+
+        return False
+
+    def consume(self, method, args, kwargs):
+        '''
+        Checks a call against the next expectation and counts it down,
+        returning it
+        '''
+        if not self.__pending and not self.__pull():
+            raise UnexpectedCallError(got=(method, args, kwargs),
+                                      message="No more method calls are " +
+                                              "expected")
+
+        expectation = self.__pending[0]
+
+        try:
+            expectation.check(method, args, kwargs)
+        except UnexpectedCallError as error:
+            error.candidates = self.nearest(method, args, kwargs)
+            raise
+
+        remaining = (self.__remaining or expectation._count()) - 1
+
+        if remaining:
+            self.__remaining = remaining
+        else:
+            self.__pending.popleft()
+            self.__remaining = None
+            _count_down_method(self.__counts, expectation.method)
+
+        return expectation
+
+
+class _CallIndex(object):
+    '''
+    Items, expectations or their positions, indexed by the method name and
+    call fingerprint of their expectation, so that finding the ones a call
+    may meet does not depend on how many there are. Items of expectations
+    without a fingerprint are kept by method name, in the order they were
+    added
+    '''
     def __init__(self):
+        self.__fingerprinted = {}
+        self.__unfingerprinted = {}
+
+    def add(self, expectation, item):
+        method = expectation.method
+        fingerprint = expectation._fingerprint
+
+        if fingerprint is None:
+            bucket = self.__unfingerprinted.setdefault(method, [])
+        else:
+            bucket = self.__fingerprinted.setdefault(method, {}) \
+                                         .setdefault(fingerprint,
+                                                     collections.deque())
+
+        bucket.append(item)
+
+    def __iter__(self):
+        for by_fingerprint in self.__fingerprinted.values():
+            for bucket in by_fingerprint.values():
+                for item in bucket:
+                    yield item
+
+        for bucket in self.__unfingerprinted.values():
+            for item in bucket:
+                yield item
+
+    def buckets(self, method, args, kwargs):
+        '''
+        Returns the buckets holding the items whose expectation a call may
+        meet
+        '''
+        fingerprint = _fingerprint(method, args, kwargs)
+        by_fingerprint = self.__fingerprinted.get(method, {})
+
+        if fingerprint is not None:
+            buckets = [by_fingerprint.get(fingerprint)]
+        else:
+            # Arguments such as matchers or custom objects may still be
+            # equal to fingerprinted values
+            buckets = list(by_fingerprint.values())
+
+        buckets.append(self.__unfingerprinted.get(method))
+
+        return [bucket for bucket in buckets if bucket]
+
+    def items(self, method):
+        '''
+        Returns an iterator over the items for method
+        '''
+        by_fingerprint = self.__fingerprinted.get(method, {})
+        # Python 2 would copy the buckets into a list with values()
+        buckets = itertools.chain(getattr(by_fingerprint, "itervalues",
+                                          by_fingerprint.values)(),
+                                  [self.__unfingerprinted.get(method, ())])
+
+        return itertools.chain.from_iterable(buckets)
+
+    def remove(self, bucket, i, expectation):
+        '''
+        Removes the item at i from bucket, one of the buckets returned for a
+        call, which holds the items of expectation
+        '''
+        del bucket[i]
+
+        if bucket:
+            return
+
+        method = expectation.method
+        fingerprint = expectation._fingerprint
+
+        if fingerprint is None:
+            del self.__unfingerprinted[method]
+        else:
+            del self.__fingerprinted[method][fingerprint]
+
+            if not self.__fingerprinted[method]:
+                del self.__fingerprinted[method]
+
+
+class _UnorderedExpectations(object):
+    '''
+    Pending expectations that may be met in any order. They are kept in a
+    _CallIndex, so finding the one a call meets does not depend on how many
+    are pending
+    '''
+    def __init__(self):
+        self.__index = _CallIndex()
+        self.__counts = {}
+        # Calls left for the expectations that were met but not depleted
+        self.__remaining = {}
+        # Every expectation added, in order, from which the pending ones are
+        # indexed again when rewound
+        self.__recorded = []
+
+    def __contains__(self, method_name):
+        return method_name in self.__counts
+
+    def append(self, expectation):
+        self.__recorded.append(expectation)
+        self.__add(expectation)
+
+    def extend(self, expectations):
+        for expectation in expectations:
+            self.append(expectation)
+
+    def __add(self, expectation):
+        self.__index.add(expectation, expectation)
+        self.__counts[expectation.method] = \
+                self.__counts.get(expectation.method, 0) + 1
+
+    def attach(self, source):
+        # Any pending expectation may be met next, so all of them are needed
+        for expectation in source:
+            self.append(expectation)
+
+    def pending(self):
+        return [e._with_count(self.__remaining[e]) if e in self.__remaining
+                else e for e in self.__index]
+
+    def clone(self):
+        '''
+        Returns a queue sharing this one's recorded expectations, with all of
+        them pending
+        '''
+        clone = _UnorderedExpectations()
+        clone.__recorded = self.__recorded
+        clone.rewind()
+
+        return clone
+
+    def rewind(self):
+        self.__index = _CallIndex()
+        self.__counts = {}
+        self.__remaining = {}
+
+        for expectation in self.__recorded:
+            self.__add(expectation)
+
+    def consume(self, method, args, kwargs):
+        '''
+        Finds a pending expectation met by a call and counts it down,
+        returning it
+        '''
+        for bucket in self.__index.buckets(method, args, kwargs):
+            for i, expectation in enumerate(bucket):
+                if expectation.matches(method, args, kwargs):
+                    remaining = (self.__remaining.pop(expectation, None) or
+                                 expectation._count()) - 1
+
+                    if remaining:
+                        self.__remaining[expectation] = remaining
+                    else:
+                        self.__index.remove(bucket, i, expectation)
+                        _count_down_method(self.__counts, method)
+
+                    return expectation
+
+        raise UnexpectedCallError(got=(method, args, kwargs),
+                                  message="No pending expectation matches",
+                                  candidates=self.nearest(method, args,
+                                                          kwargs))
+
+    def nearest(self, method, args, kwargs):
+        '''
+        Returns a function that finds the pending expectations for method
+        closest to a call, out of the ones pending now
+        '''
+        pending = list(itertools.islice(self.__index.items(method),
+                                        _NEAREST_SCANNED))
+
+        return lambda: _nearest(pending, args, kwargs)
+
+
+_method_name = operator.attrgetter("method")
+
+
+def _count_down_method(counts, method_name):
+    count = counts[method_name] - 1
+
+    if count:
+        counts[method_name] = count
+    else:
+        del counts[method_name]
+
+
+class Mock(object):
+    def __init__(self, ordered=True, thread_safe=False, clock=None):
         self.__current_expectation = None
-        self.__expectations = []
+        # Last expectation added to the pending ones while recording
+        self.__last_saved = None
         self.__always_expected = {}
         self.replay_mode = False
+        # Guards the pending expectations and the recording state. Lookups
+        # of "always" expectations don't take it, as that table is not
+        # changed once the mock is on replay mode
+        self.__lock = threading.Lock() if thread_safe else None
+        self.__clock = clock or default_clock
+        # Recorded arguments, so that identical ones are stored only once
+        self.__interned = {}
+
+        if ordered:
+            self.__expectations = _SequentialExpectations()
+        else:
+            self.__expectations = _UnorderedExpectations()
 
     def __save_current_expectation(self):
         if not self.__current_expectation:
             return
 
-        method_name = self.__current_expectation.method
-        recorded_methods = set((e.method for e in self.__expectations))
+        self.__save(self.__current_expectation)
+        self.__current_expectation = None
+
+    def __save(self, expectation):
+        method_name = expectation.method
 
-        if self.__current_expectation.is_always_expected():
-            if method_name in recorded_methods:
+        if expectation.is_always_expected():
+            if method_name in self.__expectations:
                 raise ValueError("Method already recorded without a " +
                                  "'always' modifier")
 
-            self.__always_expected[method_name] = self.__current_expectation
+            self.__always_expected[method_name] = expectation
         elif method_name in self.__always_expected:
             raise ValueError("Method already recorded with a " +
                              "'always' modifier")
+        elif (self.__last_saved is not None and
+              self.__last_saved._repeats(expectation)):
+            # Back to back repetitions of a call become a single expectation
+            # with their total count, which replays the same way
+            self.__last_saved._times = self.__last_saved._count() + \
+                                       expectation._count()
         else:
-            self.__expectations.append(self.__current_expectation)
+            self.__expectations.append(expectation)
+            self.__last_saved = expectation
 
     def enter_replay_mode(self):
         self.replay_mode = True
@@ -175,6 +1398,89 @@ class Mock(object):
         if self.__current_expectation:
             self.__save_current_expectation()
 
+        self.__interned = {}
+        self.__last_saved = None
+
+    def _clone(self):
+        if not self.replay_mode:
+            raise ValueError("Only mocks on replay mode may be cloned")
+
+        clone = object.__new__(type(self))
+        clone.__dict__.update(self.__dict__)
+
+        # Mocked methods are bound to the mock they were created for
+        for name, value in self.__dict__.items():
+            if isinstance(value, MockMethod):
+                clone.__dict__[name] = MockMethod(value.name, clone,
+                                                  value.coroutine)
+
+        clone.__always_expected = dict(self.__always_expected)
+        clone.__expectations = self.__expectations.clone()
+        clone.__lock = threading.Lock() if self.__lock is not None else None
+
+        return clone
+
+    def _reset(self):
+        if not self.replay_mode:
+            raise ValueError("Only mocks on replay mode may be reset")
+
+        if self.__lock is None:
+            self.__expectations.rewind()
+        else:
+            with self.__lock:
+                self.__expectations.rewind()
+
+    def _share(self, shared_queue):
+        '''
+        Replaces the pending expectations by the queue shared_queue builds
+        from the recorded ones and whether they are ordered. The new queue
+        guards itself. Used by mockaccino.shared
+        '''
+        if not self.replay_mode:
+            raise ValueError("Only mocks on replay mode may be shared")
+
+        ordered = isinstance(self.__expectations, _SequentialExpectations)
+        recorded = self.__expectations.clone().pending()
+
+        self.__expectations = shared_queue(recorded, ordered)
+        self.__lock = None
+
+    def _recorded_expectations(self):
+        '''
+        Returns the "always" expectations and the pending ones. Used by
+        mockaccino.cassettes
+        '''
+        self.__save_current_expectation()
+
+        return (list(self.__always_expected.values()),
+                self.__expectations.pending())
+
+    def _load_expectations(self, always_expected, source):
+        '''
+        Adds "always" expectations to the mock, and expectations to be
+        pulled from source once the recorded ones are used up. Used by
+        mockaccino.cassettes
+        '''
+        for expectation in always_expected:
+            self.__always_expected[expectation.method] = expectation
+
+        self.__expectations.attach(source)
+
+    def _stream(self, expectations):
+        if isinstance(self.__expectations, _UnorderedExpectations):
+            raise ValueError("Only ordered mocks may stream expectations")
+
+        self.__expectations.attach(self.__validated(expectations))
+
+    def __validated(self, expectations):
+        for expectation in expectations:
+            if (expectation.is_always_expected() or
+                expectation.method in self.__always_expected):
+                raise ValueError("Streamed expectations can't have or " +
+                                 "conflict with an 'always' modifier")
+
+            yield expectation
+
     def _invoked(self, mock_method, args, kwargs):
         '''
         Method called by a mock's methods when they are invoked. It checks
@@ -182,35 +1488,169 @@ class Mock(object):
         of arguments does matter, the order of keyword arguments doesn't.
         '''
         if self.replay_mode:
-            expectation = None
-
             # If the method has an "always" modifier, the next expectation
             # should not be dequeued
-            if mock_method.name in self.__always_expected:
-                expectation = self.__always_expected[mock_method.name]
-            elif self.__expectations:
-                expectation = self.__expectations[0]
+            expectation = self.__always_expected.get(mock_method.name)
+
+            # Captors are fed under the lock, as they keep state of their own
+            if expectation is not None:
+                expectation.check(mock_method.name, args, kwargs)
+
+                if expectation._plan is not None and expectation._plan[2]:
+                    if self.__lock is None:
+                        expectation._capture(args, kwargs)
+                    else:
+                        with self.__lock:
+                            expectation._capture(args, kwargs)
+            elif self.__lock is None:
+                expectation = self.__expectations.consume(mock_method.name,
+                                                          args, kwargs)
+
+                if expectation._plan is not None and expectation._plan[2]:
+                    expectation._capture(args, kwargs)
             else:
-                raise UnexpectedCallError("No more method calls are expected")
+                with self.__lock:
+                    expectation = self.__expectations.consume(
+                            mock_method.name, args, kwargs)
 
-            expectation.check(mock_method.name, args, kwargs)
+                    if expectation._plan is not None and expectation._plan[2]:
+                        expectation._capture(args, kwargs)
 
-            # If the last method has no "always" modifier, its expected
-            # call count should be decreased
-            if not expectation.is_always_expected():
-                expectation.count_down()
+            if mock_method.coroutine or expectation._asynchronous:
+                return _AwaitableOutcome(expectation, self.__clock)
 
-                if expectation.depleted():
-                    del self.__expectations[0]
+            if expectation._latency:
+                self.__clock.sleep(expectation.latency())
 
             return expectation.outcome()
+        elif self.__lock is None:
+            return self.__record(mock_method, args, kwargs)
         else:
-            self.__save_current_expectation()
+            with self.__lock:
+                return self.__record(mock_method, args, kwargs)
+
+    def __record(self, mock_method, args, kwargs):
+        self.__save_current_expectation()
+        self.__current_expectation = self.__new_expectation(mock_method.name,
+                                                            args, kwargs)
+
+        return self.__current_expectation
 
-            self.__current_expectation = Expectation(mock_method.name,
-                    args, kwargs)
+    def __new_expectation(self, method, args, kwargs):
+        expectation = Expectation(method, args, kwargs)
+
+        # Only arguments that could be fingerprinted are known to be hashable
+        if expectation._hashable:
+            expectation.args = self.__intern(args)
+            expectation.kwargs = self.__intern(kwargs)
+
+        return expectation
+
+    def _record_all(self, calls):
+        if self.replay_mode:
+            raise ValueError("Expectations can't be recorded on replay mode")
+
+        if self.__lock is None:
+            self.__record_all(calls)
+        else:
+            with self.__lock:
+                self.__record_all(calls)
+
+    def __record_all(self, calls):
+        expectations = _bulk_expectations(calls, self.__method_names())
+        always = [e for e in expectations if e._times == Expectation.ALWAYS]
+        current = [self.__current_expectation] \
+                  if self.__current_expectation else []
+
+        # The whole batch, after the expectation being recorded, is checked
+        # against the "always" rules before any of it is saved, so that a
+        # conflict leaves the mock untouched
+        if (always or self.__always_expected or
+            [e for e in current if e.is_always_expected()]):
+            self.__check_always(current + expectations)
+
+        self.__save_current_expectation()
+
+        for expectation in always:
+            self.__always_expected[expectation.method] = expectation
+
+        last = self.__last_saved
+        saved = []
+
+        for expectation in expectations:
+            if expectation._times == Expectation.ALWAYS:
+                continue
+            elif last is not None and last._repeats(expectation):
+                last._times = last._count() + expectation._count()
+            else:
+                saved.append(expectation)
+                last = expectation
+
+        self.__expectations.extend(saved)
+        self.__last_saved = last
+
+    def __method_names(self):
+        names = set(n for (n, a) in type(self).__dict__.items()
+                    if isinstance(a, _LazyMockMethod))
+        # Special methods, and the function of function mocks, are set on
+        # the mock itself
+        names.update(a.name for a in self.__dict__.values()
+                     if isinstance(a, MockMethod))
+
+        return names
+
+    def __check_always(self, expectations):
+        always = set(self.__always_expected)
+        recorded = set()
+
+        for expectation in expectations:
+            if expectation.is_always_expected():
+                if (expectation.method in recorded or
+                    expectation.method in self.__expectations):
+                    raise ValueError("Method %s already recorded " %
+                                     expectation.method +
+                                     "without a 'always' modifier")
+
+                always.add(expectation.method)
+            elif expectation.method in always:
+                raise ValueError("Method %s already recorded with a " %
+                                 expectation.method + "'always' modifier")
+            else:
+                recorded.add(expectation.method)
+
+    def __intern(self, arguments):
+        # Only plain values are interned, as equal containers, such as (1,)
+        # and ((True,),), may still hold values of different types
+        if isinstance(arguments, dict):
+            key = frozenset(arguments.items())
+            values = arguments.values()
+        else:
+            key = arguments
+            values = arguments
+
+        for value in values:
+            if type(value) not in _INTERNED_TYPES:
+                return arguments
+
+        interned = self.__interned.get(key)
+
+        if interned is None:
+            if len(self.__interned) < _INTERNED_MAX:
+                self.__interned[key] = arguments
+
+            return arguments
+
+        # Equal arguments may still differ in type, as 1 and True do
+        if isinstance(arguments, dict):
+            for name, value in arguments.items():
+                if type(value) is not type(interned[name]):
+                    return arguments
+        else:
+            for value, other in zip(arguments, interned):
+                if type(value) is not type(other):
+                    return arguments
 
-            return self.__current_expectation
+        return interned
 
     def __call__(self, *args, **kwargs):
         '''
@@ -218,7 +1658,7 @@ class Mock(object):
         object. This workaround redirects the __call__ to a bound method that
         may be changed after the object creation.
         '''
-        return self._called_as_function(args, kwargs)
+        return self._called_as_function(*args, **kwargs)
 
     def _called_as_function(self, *args, **kwargs):
         raise AttributeError("This method may only be called if overriden")
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright (c) 2012, Paolo Victor.
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+    OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+    NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+    HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+    WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+
+Recording of calls made to real objects, so that they can be replayed by
+mocks afterwards
+'''
+
+import inspect
+
+from . import _EXPORTS
+from .mocks import create_mock, _asyncio, _LazyMockMethod
+
+__all__ = _EXPORTS["recording"]
+
+
+def create_recorder(real, **options):
+    '''
+    Returns a proxy for a real object or function, and a mock created with
+    the given create_mock options. Calls made through the proxy are forwarded
+    to the real object and recorded on the mock, along with what they
+    returned or raised, so the mock replays them once set on replay mode
+    '''
+    if inspect.isfunction(real):
+        mock = create_mock(real, **options)
+    else:
+        mock = create_mock(real.__class__, **options)
+
+    return RecordingProxy(real, mock), mock
+
+
+class _RecordedAwaitable(object):
+    '''
+    Wraps the awaitable returned by a real coroutine method, recording its
+    outcome once it is done
+    '''
+    def __init__(self, awaitable, expectation):
+        self.__awaitable = awaitable
+        self.__expectation = expectation
+
+    def __await__(self):
+        future = _asyncio().ensure_future(self.__awaitable)
+        future.add_done_callback(self.__record)
+
+        return future.__await__()
+
+    __iter__ = __await__
+
+    def __record(self, future):
+        if future.cancelled():
+            return
+
+        if future.exception() is not None:
+            self.__expectation.will_raise(future.exception())
+        else:
+            self.__expectation.will_return(future.result())
+
+        self.__expectation._settled = True
+
+
+class RecordingProxy(object):
+    '''
+    Forwards calls to a real object, recording them on a mock. Attributes
+    that aren't mocked methods are returned from the real object as they are
+    '''
+    def __init__(self, real, mock):
+        self.__real = real
+        self.__mock = mock
+
+    def __getattr__(self, name):
+        attribute = getattr(self.__real, name)
+
+        if not isinstance(getattr(type(self.__mock), name, None),
+                          _LazyMockMethod):
+            return attribute
+
+        return self.__recording(attribute, getattr(self.__mock, name))
+
+    def __call__(self, *args, **kwargs):
+        return self.__recording(self.__real,
+                                self.__mock._called_as_function)(*args,
+                                                                 **kwargs)
+
+    def __recording(self, real_method, mock_method):
+        def recorded(*args, **kwargs):
+            # The call is recorded before it is forwarded, so that calls made
+            # through the proxy while it runs are recorded after it
+            expectation = mock_method(*args, **kwargs)
+            # Keeps the expectation from being merged with an identical one
+            # before its outcome is known
+            expectation._settled = False
+
+            try:
+                result = real_method(*args, **kwargs)
+            except Exception as error:
+                expectation.will_raise(error)
+                expectation._settled = True
+                raise
+
+            if mock_method.coroutine:
+                return _RecordedAwaitable(result, expectation)
+
+            expectation.will_return(result)
+            expectation._settled = True
+
+            return result
+
+        return recorded
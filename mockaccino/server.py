@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright (c) 2012, Paolo Victor.
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+    OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+    NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+    HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+    WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+
+A network stand-in for a mock on replay mode, so that processes that can't
+be handed a mock, such as the real binary of a service under a load test,
+may still be answered by one. It's an asyncio server; each request and
+reply is a line of JSON:
+
+    {"id": 1, "method": "sum", "args": [1, 2], "kwargs": {}}
+    {"id": 1, "result": 3}
+    {"id": 2, "error": {"type": "UnexpectedCallError", "message": "..."}}
+
+JSON arrays are passed to the mock as tuples, so the expected calls should
+be recorded with tuples rather than lists. A connection is closed if it
+sends a request of more than MAX_REQUEST bytes, newline aside.
+
+Replies to calls with a simulated latency are sent once it has elapsed,
+without holding up the other calls, so they may come out of order. The
+time the server itself spends on each call is reported by latency().
+
+    server = StandInServer(mock)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(server.start(port=8080))
+    loop.run_forever()
+    print server.latency() # By method name
+'''
+
+import json
+import timeit
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+from .mocks import MockMethod, _running_loop
+
+__all__ = ["StandInServer", "MethodLatency"]
+
+# Bytes a request may take, newline aside
+MAX_REQUEST = 1 << 20
+
+
+class MethodLatency(object):
+    '''
+    Time, in seconds, a stand-in server spent on the calls to a method:
+    decoding them, matching them and encoding their replies. Simulated
+    latencies are not included
+    '''
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+
+        if elapsed > self.max:
+            self.max = elapsed
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def __repr__(self):
+        return "MethodLatency(count=%d, total=%.6f, mean=%.6f, max=%.6f)" % \
+               (self.count, self.total, self.mean, self.max)
+
+
+class StandInServer(object):
+    '''
+    Answers calls made over the network with the outcomes of the calls
+    expected by a mock on replay mode
+    '''
+    def __init__(self, mock):
+        if asyncio is None:
+            raise ValueError("Stand-in servers require asyncio")
+
+        if not mock.replay_mode:
+            raise ValueError("Only mocks on replay mode may be served")
+
+        self.mock = mock
+        self.server = None
+        self.__latencies = {}
+
+    def start(self, host="127.0.0.1", port=0, loop=None):
+        '''
+        Returns an awaitable that is done once the server listens on the
+        given address, on the loop that runs it, or a future on the given
+        loop. Port 0 picks a free port, which address() then returns
+        '''
+        starting = _Starting(self, host, port)
+
+        return starting if loop is None else \
+            asyncio.ensure_future(starting, loop=loop)
+
+    def _listen(self, loop, host, port):
+        '''
+        Returns a future that is done once the server listens on loop
+        '''
+        future = loop.create_task(
+                loop.create_server(lambda: _StandInProtocol(self), host, port))
+        future.add_done_callback(self.__started)
+
+        return future
+
+    def __started(self, future):
+        if not future.cancelled() and future.exception() is None:
+            self.server = future.result()
+
+    def address(self):
+        return self.server.sockets[0].getsockname()[:2]
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+
+    def latency(self):
+        '''
+        Returns the MethodLatency of each method called so far, by name
+        '''
+        return dict(self.__latencies)
+
+    def _call(self, method, args, kwargs):
+        '''
+        Returns a future for the outcome of a call
+        '''
+        # Calls are made as to coroutine methods, so that simulated
+        # latencies don't block the event loop
+        outcome = self.mock._invoked(
+                MockMethod(method, self.mock, True),
+                _tuples(tuple(args or ())),
+                dict((k, _tuples(v)) for (k, v) in (kwargs or {}).items()))
+
+        return asyncio.ensure_future(outcome)
+
+    def _record(self, method, elapsed):
+        # Malformed requests are counted under None
+        latency = self.__latencies.get(method)
+
+        if latency is None:
+            latency = self.__latencies[method] = MethodLatency()
+
+        latency.add(elapsed)
+
+
+class _Starting(object):
+    '''
+    Starts a stand-in server on the loop it's awaited on. The loop can't be
+    looked up before then, as there may be no current one yet
+    '''
+    def __init__(self, server, host, port):
+        self.__server = server
+        self.__host = host
+        self.__port = port
+
+    def __await__(self):
+        return self.__server._listen(_running_loop(), self.__host,
+                                     self.__port).__await__()
+
+
+def _tuples(value):
+    '''
+    Returns value with the lists decoded from JSON arrays, however nested,
+    turned into tuples
+    '''
+    if isinstance(value, (list, tuple)):
+        return tuple(_tuples(v) for v in value)
+
+    if isinstance(value, dict):
+        return dict((k, _tuples(v)) for (k, v) in value.items())
+
+    return value
+
+
+def _error(error):
+    return {"type": error.__class__.__name__, "message": str(error)}
+
+
+class _StandInProtocol(asyncio.Protocol if asyncio else object):
+    '''
+    A connection to a stand-in server. There's no task per connection, so
+    that thousands of them may be open at once
+    '''
+    def __init__(self, server):
+        self.__server = server
+        self.__transport = None
+        self.__buffer = b""
+
+    def connection_made(self, transport):
+        self.__transport = transport
+
+    def connection_lost(self, error):
+        self.__transport = None
+
+    def data_received(self, data):
+        lines = (self.__buffer + data).split(b"\n")
+        self.__buffer = lines.pop()
+
+        for line in lines:
+            if len(line) > MAX_REQUEST:
+                self.__refuse()
+
+                return
+            elif line.strip():
+                self.__handle(line)
+
+        if len(self.__buffer) > MAX_REQUEST:
+            self.__refuse()
+
+    def __refuse(self):
+        '''
+        Answers a request that is too long with an error, and closes the
+        connection, as there's no telling where the next request starts
+        '''
+        self.__buffer = b""
+
+        if self.__transport is None:
+            return
+
+        self.__send({"id": None, "error": _error(ValueError(
+                "Requests must not take more than %d bytes" % MAX_REQUEST))})
+        self.__server._record(None, 0.0)
+        self.__transport.close()
+
+    def __handle(self, line):
+        start = timeit.default_timer()
+        identifier = method = None
+
+        try:
+            request = json.loads(line.decode("utf-8"))
+
+            if not isinstance(request, dict):
+                raise ValueError("Requests must be JSON objects")
+
+            identifier = request.get("id")
+
+            # Checked before the method is counted, as latencies are kept by
+            # method name
+            if not isinstance(request.get("method"), str):
+                raise ValueError("Requests must name a method")
+
+            method = request["method"]
+            future = self.__server._call(method, request.get("args"),
+                                         request.get("kwargs"))
+        except Exception as error:
+            self.__send({"id": identifier, "error": _error(error)})
+            self.__server._record(method, timeit.default_timer() - start)
+
+            return
+
+        # Time spent waiting for a simulated latency is not the server's
+        elapsed = timeit.default_timer() - start
+        future.add_done_callback(
+                lambda future: self.__reply(identifier, method, future,
+                                            elapsed))
+
+    def __reply(self, identifier, method, future, elapsed):
+        start = timeit.default_timer()
+
+        if future.cancelled():
+            return
+
+        if future.exception() is not None:
+            self.__send({"id": identifier,
+                         "error": _error(future.exception())})
+        else:
+            self.__send({"id": identifier, "result": future.result()})
+
+        self.__server._record(method,
+                              elapsed + timeit.default_timer() - start)
+
+    def __send(self, response):
+        try:
+            line = json.dumps(response)
+        except (TypeError, ValueError) as error:
+            line = json.dumps({"id": response["id"], "error": _error(error)})
+
+        if self.__transport is not None:
+            self.__transport.write(line.encode("utf-8") + b"\n")
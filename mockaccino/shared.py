@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright (c) 2012, Paolo Victor.
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+    OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+    NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+    HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+    WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+
+Mocks shared by processes. A mock on replay mode is shared before worker
+processes are forked: they inherit its recorded expectations, and keep which
+of them were met in shared memory, so that all of them replay the same
+script. Processes must be forked: spawned ones would be handed a pickled
+copy of the mock, which fails.
+
+    from mockaccino import shared
+
+    mock = mockaccino.create_mock(Service)
+    ...
+    mockaccino.replay(mock)
+    shared.share(mock)
+
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=work, args=(mock,)) for i in range(8)]
+'''
+
+import itertools
+import multiprocessing
+
+from . import _EXPORTS
+from .mocks import UnexpectedCallError, _CallIndex, _nearest, \
+                   _nearest_in_line, _NEAREST_SCANNED
+
+__all__ = _EXPORTS["shared"]
+
+
+def share(mock):
+    '''
+    Makes a mock on replay mode expect its recorded calls once across all the
+    processes forked from then on. The calls it had already met are expected
+    again, as if it had been reset. Shared mocks may be reset, from any of
+    the processes, but not cloned or given more expectations
+    '''
+    mock._share(_shared_queue)
+
+    return mock
+
+
+def _shared_queue(expectations, ordered):
+    if ordered:
+        return _SharedSequence(expectations)
+
+    return _SharedPool(expectations)
+
+
+class _SharedQueue(object):
+    '''
+    Base class for the pending expectations of shared mocks. Expectations
+    themselves are inherited by forked processes, and never changed on
+    replay; only the calls left for them are kept in shared memory
+    '''
+    def __init__(self, expectations):
+        self._expectations = expectations
+        self._methods = frozenset(e.method for e in expectations)
+        self._lock = multiprocessing.Lock()
+
+    def __contains__(self, method_name):
+        return method_name in self._methods
+
+    def attach(self, source):
+        raise ValueError("Expectations can't be streamed to shared mocks")
+
+    def clone(self):
+        raise ValueError("Shared mocks can't be cloned")
+
+
+class _SharedSequence(_SharedQueue):
+    '''
+    Shared expectations that must be met in the order they were recorded
+    '''
+    def __init__(self, expectations):
+        _SharedQueue.__init__(self, expectations)
+        # Index of the next expectation to be met, and calls left for it
+        # once it was first met
+        self.__state = multiprocessing.RawArray("l", 2)
+
+    def pending(self):
+        with self._lock:
+            position, remaining = self.__state
+
+        pending = self._expectations[position:]
+
+        if remaining:
+            pending[0] = pending[0]._with_count(remaining)
+
+        return pending
+
+    def rewind(self):
+        with self._lock:
+            self.__state[0] = self.__state[1] = 0
+
+    def consume(self, method, args, kwargs):
+        with self._lock:
+            position, remaining = self.__state
+
+            if position >= len(self._expectations):
+                raise UnexpectedCallError(got=(method, args, kwargs),
+                                          message="No more method calls " +
+                                                  "are expected")
+
+            expectation = self._expectations[position]
+
+            try:
+                expectation.check(method, args, kwargs)
+            except UnexpectedCallError as error:
+                error.candidates = _nearest_in_line(
+                        self._expectations[position:
+                                           position + _NEAREST_SCANNED],
+                        method, args, kwargs)
+                raise
+
+            remaining = (remaining or expectation._count()) - 1
+
+            if remaining:
+                self.__state[1] = remaining
+            else:
+                self.__state[0] = position + 1
+                self.__state[1] = 0
+
+        return expectation
+
+
+class _SharedPool(_SharedQueue):
+    '''
+    Shared expectations that may be met in any order. As on unordered mocks,
+    their positions are kept in a _CallIndex; depleted ones stay in the
+    index, and are skipped
+    '''
+    def __init__(self, expectations):
+        _SharedQueue.__init__(self, expectations)
+        self.__remaining = multiprocessing.RawArray(
+                "l", [e._count() for e in expectations])
+        self.__index = _CallIndex()
+
+        for i, expectation in enumerate(expectations):
+            self.__index.add(expectation, i)
+
+    def pending(self):
+        with self._lock:
+            remaining = self.__remaining[:]
+
+        return [e._with_count(count)
+                for (e, count) in zip(self._expectations, remaining) if count]
+
+    def rewind(self):
+        with self._lock:
+            for i, expectation in enumerate(self._expectations):
+                self.__remaining[i] = expectation._count()
+
+    def consume(self, method, args, kwargs):
+        buckets = self.__index.buckets(method, args, kwargs)
+
+        with self._lock:
+            for bucket in buckets:
+                for i in bucket:
+                    expectation = self._expectations[i]
+
+                    if (self.__remaining[i] and
+                        expectation.matches(method, args, kwargs)):
+                        self.__remaining[i] -= 1
+
+                        return expectation
+
+            candidates = list(itertools.islice(
+                    (self._expectations[i] for i in self.__index.items(method)
+                     if self.__remaining[i]), _NEAREST_SCANNED))
+
+        raise UnexpectedCallError(got=(method, args, kwargs),
+                                  message="No pending expectation matches",
+                                  candidates=lambda: _nearest(candidates,
+                                                              args, kwargs))
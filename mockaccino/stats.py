@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright (c) 2012, Paolo Victor.
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+    OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+    NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+    HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+    WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+
+Call statistics for mocks on replay mode. Gathering them is off by default,
+and costs nothing then: enable() wraps Mock._invoked, and disable() puts the
+original method back.
+
+    from mockaccino import stats
+
+    stats.enable()
+    ...
+    print stats.of(mock)["method"].invocations
+    print stats.aggregate()
+'''
+
+import sys
+import threading
+import timeit
+import weakref
+
+from .mocks import Mock, UnexpectedCallError
+
+_invoked = Mock.__dict__["_invoked"]
+
+# Statistics of each mock, by method name
+_registry = weakref.WeakKeyDictionary()
+
+# Guards the registry and the counters in it, as mocks may be called from
+# several threads. Calls are not made under it
+_lock = threading.Lock()
+
+
+class MethodStats(object):
+    '''
+    Counters for the calls made to a mocked method on replay mode. "time" is
+    the total time, in seconds, spent matching them and producing their
+    outcome, including the latencies of synchronous calls simulated with
+    will_take, which are waited for then, and "sizes" is a histogram of the
+    calls' argument sizes: it maps a power of two to the number of calls
+    whose arguments took, in bytes, up to that size and more than its half
+    '''
+    __slots__ = ("invocations", "matches", "mismatches", "time", "sizes")
+
+    def __init__(self):
+        self.invocations = 0
+        self.matches = 0
+        self.mismatches = 0
+        self.time = 0.0
+        self.sizes = {}
+
+    def add(self, other):
+        self.invocations += other.invocations
+        self.matches += other.matches
+        self.mismatches += other.mismatches
+        self.time += other.time
+
+        for size, count in other.sizes.items():
+            self.sizes[size] = self.sizes.get(size, 0) + count
+
+    def __repr__(self):
+        return ("MethodStats(invocations=%d, matches=%d, mismatches=%d, " +
+                "time=%.6f)") % (self.invocations, self.matches,
+                                 self.mismatches, self.time)
+
+
+def _arguments_size(args, kwargs):
+    # Shallow sizes: cheap, and still proportional to the length of
+    # containers such as lists of rows
+    size = 0
+
+    for value in args:
+        size += sys.getsizeof(value)
+
+    for value in kwargs.values():
+        size += sys.getsizeof(value)
+
+    return size
+
+
+def _instrumented_invoked(mock, mock_method, args, kwargs):
+    if not mock.replay_mode:
+        return _invoked(mock, mock_method, args, kwargs)
+
+    bucket = 1 << _arguments_size(args, kwargs).bit_length()
+
+    with _lock:
+        by_method = _registry.get(mock)
+
+        if by_method is None:
+            by_method = _registry[mock] = {}
+
+        stats = by_method.get(mock_method.name)
+
+        if stats is None:
+            stats = by_method[mock_method.name] = MethodStats()
+
+        stats.invocations += 1
+        stats.sizes[bucket] = stats.sizes.get(bucket, 0) + 1
+
+    start = timeit.default_timer()
+    # Errors recorded with will_raise are matches too
+    matched = True
+
+    try:
+        return _invoked(mock, mock_method, args, kwargs)
+    except UnexpectedCallError:
+        matched = False
+        raise
+    finally:
+        elapsed = timeit.default_timer() - start
+
+        with _lock:
+            if matched:
+                stats.matches += 1
+            else:
+                stats.mismatches += 1
+
+            stats.time += elapsed
+
+
+def enable():
+    '''
+    Starts gathering statistics for calls made to mocks on replay mode
+    '''
+    Mock._invoked = _instrumented_invoked
+
+
+def disable():
+    '''
+    Stops gathering statistics. Those already gathered are kept
+    '''
+    Mock._invoked = _invoked
+
+
+def enabled():
+    return Mock.__dict__["_invoked"] is _instrumented_invoked
+
+
+def of(mock):
+    '''
+    Returns the statistics of a mock, by method name
+    '''
+    with _lock:
+        return dict(_registry.get(mock, {}))
+
+
+def aggregate():
+    '''
+    Returns the statistics of all mocks still alive, summed by mock class
+    name and method name
+    '''
+    totals = {}
+
+    with _lock:
+        for mock, by_method in list(_registry.items()):
+            for name, stats in by_method.items():
+                key = (type(mock).__name__, name)
+
+                if key not in totals:
+                    totals[key] = MethodStats()
+
+                totals[key].add(stats)
+
+    return totals
+
+
+def reset():
+    '''
+    Discards the statistics gathered so far
+    '''
+    with _lock:
+        _registry.clear()
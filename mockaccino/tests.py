@@ -24,12 +24,67 @@ conditions:
     OTHER DEALINGS IN THE SOFTWARE.
 '''
 
+import json
+import os
 import unittest
 import mockaccino
-from mockaccino.matchers import any
+from mockaccino import shared
+from mockaccino.matchers import any, any_of, between, captor, contains, \
+                                regex, shape, that
+from mockaccino.timing import Percentiles, VirtualClock
 
 from nose.tools import raises
 
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+# Tests asserting wall-clock times only run when asked for, as they fail on
+# loaded machines
+TIMING_TESTS = bool(os.environ.get("MOCKACCINO_TIMING_TESTS"))
+
+
+def run_async(awaitable):
+    '''
+    Runs an awaitable to completion on a new event loop
+    '''
+    loop = asyncio.new_event_loop()
+
+    try:
+        return loop.run_until_complete(asyncio.ensure_future(awaitable,
+                                                             loop=loop))
+    finally:
+        loop.close()
+
+
+def coroutine_service():
+    '''
+    Returns a class with a coroutine method. It is built at runtime, since
+    the syntax can't be parsed without asyncio support
+    '''
+    namespace = {}
+    exec("class Service(object):\n"
+         "    async def fetch(self, key): pass\n"
+         "    def close(self): pass\n", namespace)
+    return namespace["Service"]
+
+
+class _Transport(object):
+    '''
+    Stands in for the transport of a stand-in server's connection, keeping
+    what is written to it
+    '''
+    def __init__(self):
+        self.written = []
+        self.closed = False
+
+    def write(self, data):
+        self.written.append(data)
+
+    def close(self):
+        self.closed = True
+
 
 class MockTests(unittest.TestCase):
     class MockedClass(object):
@@ -257,7 +312,8 @@ class MockTests(unittest.TestCase):
 
     def test_call_after_times_modifier(self):
         '''
-        After a method is called enough times, the next expectiation should be set
+        After a method is called enough times, the next expectiation should be
+        set
         '''
         mock = mockaccino.create_mock(self.MockedClass)
 
@@ -618,3 +674,1785 @@ class MockTests(unittest.TestCase):
         mockaccino.replay(mock)
 
         mock.method_with_two_parameters(2, "a")
+
+    def test_blueprint_cache_hit_on_second_mock(self):
+        '''
+        Mocking the same class twice should reuse the cached blueprint
+        '''
+        class Cached(object):
+            def method(self): pass
+
+        before = mockaccino.blueprint_cache_info()
+
+        first = mockaccino.create_mock(Cached)
+        second = mockaccino.create_mock(Cached)
+
+        after = mockaccino.blueprint_cache_info()
+
+        assert after.misses == before.misses + 1
+        assert after.hits == before.hits + 1
+
+        first.method().will_return(1)
+        second.method().will_return(2)
+        mockaccino.replay(first, second)
+
+        assert second.method() == 2
+        assert first.method() == 1
+
+    def test_blueprint_cache_misses_on_redefined_class(self):
+        '''
+        A redefined class should not reuse the blueprint of its previous
+        definition
+        '''
+        class Redefined(object):
+            def old_method(self): pass
+
+        mockaccino.create_mock(Redefined)
+
+        class Redefined(object):
+            def new_method(self): pass
+
+        before = mockaccino.blueprint_cache_info()
+        mock = mockaccino.create_mock(Redefined)
+
+        assert mockaccino.blueprint_cache_info().misses == before.misses + 1
+        assert hasattr(mock, "new_method")
+        assert not hasattr(mock, "old_method")
+
+    def test_clear_blueprint_cache(self):
+        '''
+        Clearing the blueprint cache should reset its counters
+        '''
+        mockaccino.create_mock(self.MockedClass)
+        mockaccino.clear_blueprint_cache()
+
+        assert mockaccino.blueprint_cache_info() == (0, 0, 0)
+
+    def test_mocks_of_a_class_share_a_generated_mock_class(self):
+        '''
+        Mocks of the same class should be instances of one generated
+        Mock subclass
+        '''
+        first = mockaccino.create_mock(self.MockedClass)
+        second = mockaccino.create_mock(self.MockedClass)
+
+        assert type(first) is type(second)
+        assert isinstance(first, mockaccino.Mock)
+
+    def test_mock_methods_are_created_lazily(self):
+        '''
+        Mock methods should only be created when first accessed, and
+        then be reused
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        assert "method_with_parameter" not in vars(mock)
+
+        method = mock.method_with_parameter
+
+        assert vars(mock)["method_with_parameter"] is method
+        assert mock.method_with_parameter is method
+
+    @raises(ValueError)
+    def test_always_conflict_detected_after_many_recorded_calls(self):
+        '''
+        A method recorded among many others should still refuse a later
+        "always" expectation
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        mock.method_that_returns_an_int()
+
+        for i in range(10000):
+            mock.method_with_parameter(i)
+
+        mock.method_that_returns_an_int().always()
+
+        mockaccino.replay(mock)
+
+    def test_fingerprint_is_equal_for_equal_calls(self):
+        '''
+        Equal calls made of plain values should have equal fingerprints
+        '''
+        first = mockaccino.Expectation("method", (1, ("a", 2.0)), {"k": 3})
+        second = mockaccino.Expectation("method", (1, ("a", 2)), {"k": 3})
+
+        assert first._fingerprint is not None
+        assert first._fingerprint == second._fingerprint
+        assert first.matches("method", (1, ("a", 2)), {"k": 3})
+
+    def test_no_fingerprint_for_mutable_arguments_or_matchers(self):
+        '''
+        Calls with mutable arguments or matchers should not be fingerprinted,
+        and should still be matched by comparison
+        '''
+        with_list = mockaccino.Expectation("method", ([1, 2],), {})
+        with_matcher = mockaccino.Expectation("method", (any(int),), {})
+
+        assert with_list._fingerprint is None
+        assert with_matcher._fingerprint is None
+        assert with_list.matches("method", ([1, 2],), {})
+        assert with_matcher.matches("method", (5,), {})
+
+    def test_interned_arguments_keep_their_types(self):
+        '''
+        Equal recorded arguments of different types, or floats of different
+        signs, should not be merged
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        mock.method_with_parameter(1)
+        as_bool = mock.method_with_parameter(True)
+        mock.method_with_parameter(0.0)
+        negative = mock.method_with_parameter(-0.0)
+
+        assert as_bool.args[0] is True
+        assert repr(negative.args[0]) == "-0.0"
+
+    def test_interned_arguments_are_shared(self):
+        '''
+        Equal recorded arguments should be stored once
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        first = mock.method_with_parameter("a" * 10)
+        second = mock.method_with_parameter("a" * 10)
+
+        assert first.args is second.args
+
+    @raises(mockaccino.UnexpectedCallError)
+    def test_large_mismatched_arguments_raise_unexpected_call_error(self):
+        '''
+        Calls with large, fingerprinted arguments should still raise an
+        error when they differ from what was recorded
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+        mock.method_with_parameter(tuple(range(100000)))
+        mockaccino.replay(mock)
+        mock.method_with_parameter(tuple(range(1, 100001)))
+
+    def test_unordered_mock_accepts_calls_in_any_order(self):
+        '''
+        Unordered mocks should match calls regardless of recording order
+        '''
+        mock = mockaccino.create_mock(self.MockedClass, ordered=False)
+
+        mock.method_with_parameter(1).will_return("one")
+        mock.method_with_parameter(2).will_return("two").times(2)
+        mock.method_with_two_parameters(1, b=[2]).will_return("three")
+
+        mockaccino.replay(mock)
+
+        assert mock.method_with_two_parameters(1, b=[2]) == "three"
+        assert mock.method_with_parameter(2) == "two"
+        assert mock.method_with_parameter(1) == "one"
+        assert mock.method_with_parameter(2) == "two"
+
+    @raises(mockaccino.UnexpectedCallError)
+    def test_unordered_mock_depletes_expectations(self):
+        '''
+        Unordered mocks should still count expected calls down
+        '''
+        mock = mockaccino.create_mock(self.MockedClass, ordered=False)
+
+        mock.method_with_parameter(1).times(2)
+        mock.method_with_parameter(2)
+
+        mockaccino.replay(mock)
+
+        mock.method_with_parameter(1)
+        mock.method_with_parameter(2)
+        mock.method_with_parameter(1)
+        mock.method_with_parameter(1)
+
+    def test_unordered_mock_with_matchers(self):
+        '''
+        Unordered mocks should match expectations recorded with matchers
+        '''
+        mock = mockaccino.create_mock(self.MockedClass, ordered=False)
+
+        mock.method_with_parameter(any(str)).will_return("string")
+        mock.method_with_parameter(1).will_return("one")
+
+        mockaccino.replay(mock)
+
+        assert mock.method_with_parameter("cat") == "string"
+        assert mock.method_with_parameter(1) == "one"
+
+    def test_unordered_mock_with_many_pending_expectations(self):
+        '''
+        Unordered mocks should handle thousands of pending expectations
+        '''
+        mock = mockaccino.create_mock(self.MockedClass, ordered=False)
+
+        for i in range(5000):
+            mock.method_with_parameter(i).will_return(i)
+
+        mockaccino.replay(mock)
+
+        for i in reversed(range(5000)):
+            assert mock.method_with_parameter(i) == i
+
+    def test_thread_safe_mock_shared_by_many_threads(self):
+        '''
+        A thread safe mock should meet every expected call made by
+        concurrent threads, and no more
+        '''
+        import threading
+
+        threads, calls = 16, 2000
+        errors = []
+
+        mock = mockaccino.create_mock(self.MockedClass, thread_safe=True)
+
+        mock.method_that_returns_an_int().will_return(1).always()
+        mock.method_with_parameter(1).will_return(2).times(threads * calls)
+
+        mockaccino.replay(mock)
+
+        def worker():
+            try:
+                for i in range(calls):
+                    assert mock.method_that_returns_an_int() == 1
+                    assert mock.method_with_parameter(1) == 2
+            except Exception as e:
+                errors.append(e)
+
+        workers = [threading.Thread(target=worker) for i in range(threads)]
+
+        for thread in workers:
+            thread.start()
+
+        for thread in workers:
+            thread.join()
+
+        assert not errors
+
+        try:
+            mock.method_with_parameter(1)
+        except mockaccino.UnexpectedCallError:
+            pass
+        else:
+            assert False, "All expected calls should have been met"
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def test_coroutine_method_returns_awaitable(self):
+        '''
+        Coroutine methods should return awaitables for their outcome
+        '''
+        mock = mockaccino.create_mock(coroutine_service())
+
+        mock.fetch("key").will_return("value")
+        mock.close()
+
+        mockaccino.replay(mock)
+
+        assert run_async(mock.fetch("key")) == "value"
+        assert mock.close() is None
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    @raises(ValueError)
+    def test_coroutine_method_raises_when_awaited(self):
+        '''
+        Errors recorded for coroutine methods should be raised on await
+        '''
+        mock = mockaccino.create_mock(coroutine_service())
+        mock.fetch("key").will_raise(ValueError())
+        mockaccino.replay(mock)
+
+        awaitable = mock.fetch("key")
+        run_async(awaitable)
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def test_asynchronous_outcomes_with_latency_run_concurrently(self):
+        '''
+        Awaitable outcomes should take their latency without blocking the
+        event loop
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+        mock.method_with_parameter(1).will_return(2).asynchronous() \
+                                    .will_take(50).times(10)
+        mockaccino.replay(mock)
+
+        loop = asyncio.new_event_loop()
+        start = loop.time()
+
+        try:
+            results = loop.run_until_complete(asyncio.gather(
+                    *[asyncio.ensure_future(mock.method_with_parameter(1),
+                                            loop=loop) for i in range(10)]))
+        finally:
+            loop.close()
+
+        assert results == [2] * 10
+
+        if TIMING_TESTS:
+            assert 0.05 <= loop.time() - start < 0.45
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def test_stand_in_server(self):
+        '''
+        A stand-in server should answer calls made over the network with
+        the mock's outcomes, and report the time spent on them
+        '''
+        from mockaccino.server import StandInServer
+
+        mock = mockaccino.create_mock(self.MockedClass)
+        mock.method_with_parameter(1).will_return(2)
+        mock.method_with_two_parameters("a", b=None).will_raise(KeyError())
+        mockaccino.replay(mock)
+
+        server = StandInServer(mock)
+        loop = asyncio.new_event_loop()
+
+        try:
+            loop.run_until_complete(server.start(loop=loop))
+            reader, writer = loop.run_until_complete(
+                    asyncio.open_connection(*server.address()))
+
+            writer.write(b'{"id": 1, "method": "method_with_parameter", '
+                         b'"args": [1]}\n'
+                         b'{"id": 2, "method": "method_with_two_parameters", '
+                         b'"args": ["a"], "kwargs": {"b": null}}\n'
+                         b'{"id": 3, "method": "method_with_parameter", '
+                         b'"args": [1]}\n')
+
+            replies = [json.loads(loop.run_until_complete(reader.readline())
+                                      .decode("utf-8")) for i in range(3)]
+
+            writer.close()
+            server.close()
+        finally:
+            loop.close()
+
+        replies.sort(key=lambda reply: reply["id"])
+
+        assert replies[0] == {"id": 1, "result": 2}
+        assert replies[1]["error"]["type"] == "KeyError"
+        assert replies[2]["error"]["type"] == "UnexpectedCallError"
+        assert server.latency()["method_with_parameter"].count == 2
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def test_stand_in_server_started_on_a_new_loop(self):
+        '''
+        A stand-in server should start on the loop that runs it, and match
+        JSON arrays, however nested, with recorded tuples
+        '''
+        from mockaccino.server import StandInServer
+
+        mock = mockaccino.create_mock(self.MockedClass)
+        mock.method_with_parameter((1, (2, 3))).will_return(4)
+        mockaccino.replay(mock)
+
+        server = StandInServer(mock)
+        loop = asyncio.new_event_loop()
+
+        try:
+            loop.run_until_complete(server.start())
+            reader, writer = loop.run_until_complete(
+                    asyncio.open_connection(*server.address()))
+
+            writer.write(b'{"id": 1, "method": "method_with_parameter", '
+                         b'"args": [[1, [2, 3]]]}\n')
+            reply = json.loads(loop.run_until_complete(reader.readline())
+                               .decode("utf-8"))
+
+            writer.close()
+            server.close()
+        finally:
+            loop.close()
+
+        assert reply == {"id": 1, "result": 4}
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def test_stand_in_server_closes_connections_with_long_requests(self):
+        '''
+        A stand-in server should answer with an error and close the
+        connection once a request takes more than MAX_REQUEST bytes
+        '''
+        from mockaccino import server as stand_in
+
+        mock = mockaccino.create_mock(self.MockedClass)
+        mockaccino.replay(mock)
+
+        server = stand_in.StandInServer(mock)
+        loop = asyncio.new_event_loop()
+
+        try:
+            loop.run_until_complete(server.start())
+            reader, writer = loop.run_until_complete(
+                    asyncio.open_connection(*server.address()))
+
+            writer.write(b"[" * (stand_in.MAX_REQUEST + 1))
+            reply = json.loads(loop.run_until_complete(reader.readline())
+                               .decode("utf-8"))
+            rest = loop.run_until_complete(reader.read())
+
+            writer.close()
+            server.close()
+        finally:
+            loop.close()
+
+        assert reply["error"]["type"] == "ValueError"
+        assert rest == b""
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def test_stand_in_server_refuses_long_complete_requests(self):
+        '''
+        A stand-in server should refuse a request of more than MAX_REQUEST
+        bytes even when its newline came in the same data, and not handle
+        the requests after it
+        '''
+        from mockaccino import server as stand_in
+
+        mock = mockaccino.create_mock(self.MockedClass)
+        mockaccino.replay(mock)
+
+        transport = _Transport()
+        protocol = stand_in._StandInProtocol(stand_in.StandInServer(mock))
+        protocol.connection_made(transport)
+        protocol.data_received(b"[" * (stand_in.MAX_REQUEST + 1) + b"\n" +
+                               b'{"id": 1, "method": "method"}\n')
+
+        assert len(transport.written) == 1
+        assert json.loads(transport.written[0].decode("utf-8")) \
+                   ["error"]["type"] == "ValueError"
+        assert transport.closed
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def test_stand_in_server_refuses_requests_without_a_method_name(self):
+        '''
+        A stand-in server should answer requests whose method is not a
+        string with an error, and keep the connection open
+        '''
+        from mockaccino import server as stand_in
+
+        mock = mockaccino.create_mock(self.MockedClass)
+        mockaccino.replay(mock)
+
+        server = stand_in.StandInServer(mock)
+        transport = _Transport()
+        protocol = stand_in._StandInProtocol(server)
+        protocol.connection_made(transport)
+        protocol.data_received(b'{"id": 1, "method": ["a"]}\n'
+                               b'{"id": 2, "method": {"a": 1}}\n')
+
+        replies = [json.loads(line.decode("utf-8"))
+                   for line in transport.written]
+
+        assert [r["id"] for r in replies] == [1, 2]
+        assert [r["error"]["type"] for r in replies] == ["ValueError"] * 2
+        assert server.latency()[None].count == 2
+        assert not transport.closed
+
+    def test_will_take_on_virtual_clock(self):
+        '''
+        Latencies of synchronous calls should be simulated on the mock's
+        clock, and accumulate on it
+        '''
+        clock = VirtualClock()
+        mock = mockaccino.create_mock(self.MockedClass, clock=clock)
+
+        mock.method_with_parameter(1).will_return(2).will_take(250).times(2)
+        mock.method_that_returns_an_int().will_take(ms=500)
+
+        mockaccino.replay(mock)
+
+        assert mock.method_with_parameter(1) == 2
+        assert mock.method_with_parameter(1) == 2
+        mock.method_that_returns_an_int()
+
+        assert clock.elapsed == clock.now == 1.0
+
+    def test_will_take_with_percentiles_profile(self):
+        '''
+        Latencies sampled from a percentiles profile should stay within
+        its bounds
+        '''
+        import random
+
+        clock = VirtualClock()
+        profile = Percentiles({50: 10, 90: 40, 99: 100},
+                              rng=random.Random(42))
+        mock = mockaccino.create_mock(self.MockedClass, clock=clock)
+
+        mock.method_that_returns_an_int().will_take(profile=profile).always()
+
+        mockaccino.replay(mock)
+
+        for i in range(1000):
+            mock.method_that_returns_an_int()
+
+        assert 10 <= clock.elapsed <= 100
+
+    @raises(ValueError)
+    def test_will_take_requires_latency_or_profile(self):
+        '''
+        will_take should be given either a latency or a profile
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+        mock.method_that_returns_an_int().will_take()
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def test_awaitable_latency_on_virtual_clock(self):
+        '''
+        Awaitable outcomes should not wait on a virtual clock, but still
+        account for their latency
+        '''
+        clock = VirtualClock()
+        mock = mockaccino.create_mock(coroutine_service(), clock=clock)
+        mock.fetch("key").will_return("value").will_take(60000)
+        mockaccino.replay(mock)
+
+        assert run_async(mock.fetch("key")) == "value"
+        assert clock.elapsed == 60
+
+    def test_recorder_captures_calls_for_replay(self):
+        '''
+        Calls made through a recording proxy should reach the real object,
+        and be replayed by the recorder's mock
+        '''
+        class Calc(object):
+            def __init__(self):
+                self.calls = 0
+
+            def sum(self, a, b):
+                self.calls += 1
+                return a + b
+
+            def divide(self, a, b):
+                return a / b
+
+        calc = Calc()
+        proxy, mock = mockaccino.create_recorder(calc)
+
+        assert proxy.sum(1, 2) == 3
+        assert proxy.sum(2, b=2) == 4
+
+        try:
+            proxy.divide(1, 0)
+        except ZeroDivisionError:
+            pass
+
+        assert proxy.calls == calc.calls == 2
+
+        mockaccino.replay(mock)
+
+        assert mock.sum(1, 2) == 3
+        assert mock.sum(2, b=2) == 4
+
+        try:
+            mock.divide(1, 0)
+        except ZeroDivisionError:
+            pass
+        else:
+            assert False, "The recorded error should have been raised"
+
+        assert calc.calls == 2
+
+    def test_recorder_for_function(self):
+        '''
+        Functions may be recorded as well
+        '''
+        def double(n):
+            return n * 2
+
+        proxy, mock = mockaccino.create_recorder(double)
+
+        assert proxy(2) == 4
+        assert proxy(3) == 6
+
+        mockaccino.replay(mock)
+
+        assert mock(2) == 4
+        assert mock(3) == 6
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def test_recorder_for_coroutine_method(self):
+        '''
+        Results of coroutine methods should be recorded once awaited
+        '''
+        namespace = {}
+        exec("class Service(object):\n"
+             "    async def fetch(self, key):\n"
+             "        return key.upper()\n", namespace)
+
+        proxy, mock = mockaccino.create_recorder(namespace["Service"]())
+
+        assert run_async(proxy.fetch("key")) == "KEY"
+
+        mockaccino.replay(mock)
+
+        assert run_async(mock.fetch("key")) == "KEY"
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def test_recorded_coroutine_calls_are_not_merged_before_awaited(self):
+        '''
+        Identical coroutine calls recorded through a proxy should keep their
+        own results, which are only known once they are awaited
+        '''
+        namespace = {}
+        exec("class Service(object):\n"
+             "    calls = 0\n"
+             "    async def fetch(self, key):\n"
+             "        self.calls += 1\n"
+             "        return self.calls\n"
+             "    def other(self): pass\n", namespace)
+
+        proxy, mock = mockaccino.create_recorder(namespace["Service"]())
+
+        first = proxy.fetch("k")
+        second = proxy.fetch("k")
+        proxy.other()
+
+        assert run_async(first) == 1
+        assert run_async(second) == 2
+
+        mockaccino.replay(mock)
+
+        assert run_async(mock.fetch("k")) == 1
+        assert run_async(mock.fetch("k")) == 2
+
+    def test_cassette_round_trip(self):
+        '''
+        Expectations saved to a cassette should be replayed by the mock
+        loaded from it, along with their "always" modifiers and counts
+        '''
+        import os
+        import tempfile
+
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        mock.method_that_returns_an_int().will_return(1).always()
+        mock.method_with_parameter(1).will_return([1, 2]).times(3)
+        mock.method_with_two_parameters("a", b=None).will_raise(KeyError())
+
+        mockaccino.replay(mock)
+        mock.method_with_parameter(1)
+
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+
+        try:
+            mockaccino.save_cassette(mock, path)
+            loaded = mockaccino.load_cassette(self.MockedClass, path)
+            mockaccino.replay(loaded)
+
+            assert loaded.method_that_returns_an_int() == 1
+            assert loaded.method_with_parameter(1) == [1, 2]
+            assert loaded.method_with_parameter(1) == [1, 2]
+            assert loaded.method_that_returns_an_int() == 1
+
+            try:
+                loaded.method_with_two_parameters("a", b=None)
+            except KeyError:
+                pass
+            else:
+                assert False, "The recorded error should have been raised"
+
+            try:
+                loaded.method_with_parameter(1)
+            except mockaccino.UnexpectedCallError:
+                pass
+            else:
+                assert False, "All expected calls should have been met"
+        finally:
+            os.remove(path)
+
+    def test_cassette_is_loaded_as_replay_reaches_it(self):
+        '''
+        Expectations should be read from a cassette only when needed
+        '''
+        import os
+        import tempfile
+
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        for i in range(10000):
+            mock.method_with_parameter(i).will_return(i)
+
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+
+        try:
+            mockaccino.save_cassette(mock, path)
+            loaded = mockaccino.load_cassette(self.MockedClass, path)
+            mockaccino.replay(loaded)
+
+            assert loaded.method_with_parameter(0) == 0
+            assert len(loaded._recorded_expectations()[1]) == 0
+
+            for i in range(1, 10000):
+                assert loaded.method_with_parameter(i) == i
+        finally:
+            os.remove(path)
+
+    @raises(ValueError)
+    def test_loading_a_file_that_is_not_a_cassette(self):
+        '''
+        Loading a file that is not a cassette should raise an error
+        '''
+        import tempfile
+
+        with tempfile.NamedTemporaryFile() as not_a_cassette:
+            not_a_cassette.write(b"not a cassette")
+            not_a_cassette.flush()
+
+            mockaccino.load_cassette(self.MockedClass, not_a_cassette.name)
+
+    def test_loading_a_file_shorter_than_a_cassette_header(self):
+        '''
+        Loading a file too short to hold a cassette header should raise a
+        ValueError
+        '''
+        import tempfile
+
+        for content in (b"", b"MKC"):
+            with tempfile.NamedTemporaryFile() as not_a_cassette:
+                not_a_cassette.write(content)
+                not_a_cassette.flush()
+
+                self.assertRaises(ValueError, mockaccino.load_cassette,
+                                  self.MockedClass, not_a_cassette.name)
+
+    def test_loading_a_cassette_with_an_unknown_record_kind(self):
+        '''
+        Loading a cassette with a record of unknown kind should raise a
+        ValueError naming the file and the record's offset
+        '''
+        import os
+        import tempfile
+
+        from mockaccino import cassettes
+
+        mock = mockaccino.create_mock(self.MockedClass)
+        mock.method_with_parameter(1).will_return(1)
+
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+
+        try:
+            mockaccino.save_cassette(mock, path)
+
+            with open(path, "rb+") as cassette:
+                cassette.seek(cassettes._HEADER.size)
+                cassette.write(b"\x07")
+
+            try:
+                loaded = mockaccino.load_cassette(self.MockedClass, path)
+                mockaccino.replay(loaded)
+                loaded.method_with_parameter(1)
+            except ValueError as error:
+                assert path in str(error)
+                assert "offset %d" % cassettes._HEADER.size in str(error)
+            else:
+                assert False, "The record should have been refused"
+        finally:
+            os.remove(path)
+
+    def test_replaying_a_truncated_cassette(self):
+        '''
+        Replay should raise a ValueError once it reaches the truncated record
+        of a cassette, after meeting the complete ones
+        '''
+        import os
+        import tempfile
+
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        for i in range(3):
+            mock.method_with_parameter(i).will_return(i)
+
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+
+        try:
+            mockaccino.save_cassette(mock, path)
+
+            with open(path, "rb+") as cassette:
+                cassette.truncate(os.path.getsize(path) - 1)
+
+            loaded = mockaccino.load_cassette(self.MockedClass, path)
+            mockaccino.replay(loaded)
+
+            assert loaded.method_with_parameter(0) == 0
+            assert loaded.method_with_parameter(1) == 1
+            self.assertRaises(ValueError, loaded.method_with_parameter, 2)
+        finally:
+            os.remove(path)
+
+    def test_streamed_expectations_after_recorded_ones(self):
+        '''
+        Streamed expectations should be met after the recorded ones, while
+        "always" expectations take precedence
+        '''
+        import itertools
+
+        def expectations():
+            for i in itertools.count():
+                yield mockaccino.Expectation("method_with_parameter",
+                                             (i,)).will_return(i * 2)
+
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        mock.method_that_returns_an_int().will_return(-1).always()
+        mock.method_with_no_return_value()
+
+        mockaccino.stream(mock, expectations())
+        mockaccino.replay(mock)
+
+        mock.method_with_no_return_value()
+
+        for i in range(10000):
+            assert mock.method_with_parameter(i) == i * 2
+            assert mock.method_that_returns_an_int() == -1
+
+    @raises(mockaccino.UnexpectedCallError)
+    def test_exhausted_stream_raises_unexpected_call_error(self):
+        '''
+        Calls after a stream is used up should be unexpected
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        mockaccino.stream(mock,
+                          [mockaccino.Expectation("method_with_parameter",
+                                                  (1,))])
+        mockaccino.replay(mock)
+
+        mock.method_with_parameter(1)
+        mock.method_with_parameter(1)
+
+    def test_streaming_on_unordered_mock(self):
+        '''
+        Unordered mocks should refuse to stream expectations, as they would
+        need to read an unbounded stream whole
+        '''
+        def expectations():
+            while True:
+                yield mockaccino.Expectation("method_with_parameter", (1,))
+
+        mock = mockaccino.create_mock(self.MockedClass, ordered=False)
+
+        self.assertRaises(ValueError, mockaccino.stream, mock, expectations())
+
+    @raises(ValueError)
+    def test_streamed_expectation_conflicting_with_always(self):
+        '''
+        Streamed expectations for a method with an "always" modifier should
+        be refused
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        mock.method_that_returns_an_int().always()
+        mockaccino.stream(mock, [mockaccino.Expectation(
+                "method_that_returns_an_int")])
+        mockaccino.replay(mock)
+
+        mock.method_with_parameter(1)
+
+    def test_record_all(self):
+        '''
+        Expectations recorded in bulk should replay like the ones recorded
+        call by call
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        mock.method_with_no_return_value()
+        mockaccino.record_all(mock, [
+            ("method_with_parameter", (1,), None, "one", 2),
+            ("method_with_two_parameters", (1,), {"b": 2}, ValueError(),
+             None),
+            ("method_that_returns_an_int", (), None, 3,
+             mockaccino.Expectation.ALWAYS)])
+        mockaccino.replay(mock)
+
+        mock.method_with_no_return_value()
+        assert mock.method_with_parameter(1) == "one"
+        assert mock.method_with_parameter(1) == "one"
+        self.assertRaises(ValueError, mock.method_with_two_parameters, 1, b=2)
+        assert mock.method_that_returns_an_int() == 3
+        assert mock.method_that_returns_an_int() == 3
+
+    def test_record_all_conflict_leaves_mock_untouched(self):
+        '''
+        A batch conflicting with an "always" modifier should be refused as a
+        whole
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        self.assertRaises(ValueError, mockaccino.record_all, mock, [
+            ("method_with_parameter", (1,), None, None, None),
+            ("method_that_returns_an_int", (), None, 1,
+             mockaccino.Expectation.ALWAYS),
+            ("method_that_returns_an_int", (), None, 2, None)])
+        mockaccino.replay(mock)
+
+        self.assertRaises(mockaccino.UnexpectedCallError,
+                          mock.method_with_parameter, 1)
+
+    def test_record_all_conflict_leaves_current_expectation_open(self):
+        '''
+        A refused batch should not save the expectation being recorded, which
+        may still be changed
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        mock.method_with_parameter(1)
+        expectation = mock.method_with_parameter(1)
+
+        self.assertRaises(ValueError, mockaccino.record_all, mock, [
+            ("method_that_returns_an_int", (), None, 1,
+             mockaccino.Expectation.ALWAYS),
+            ("method_that_returns_an_int", (), None, 2, None)])
+
+        expectation.will_return(2)
+        mock.method_that_returns_an_int().always()
+
+        self.assertRaises(ValueError, mockaccino.record_all, mock, [
+            ("method_that_returns_an_int", (), None, 3, None)])
+        mockaccino.replay(mock)
+
+        assert mock.method_with_parameter(1) is None
+        assert mock.method_with_parameter(1) == 2
+
+    def test_record_all_unknown_method(self):
+        '''
+        A batch with a method the mock doesn't have should be refused as a
+        whole
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        self.assertRaises(ValueError, mockaccino.record_all, mock, [
+            ("method_with_parameter", (1,), None, None, None),
+            ("no_such_method", (), None, None, None)])
+        mockaccino.replay(mock)
+
+        self.assertRaises(mockaccino.UnexpectedCallError,
+                          mock.method_with_parameter, 1)
+
+    def test_record_all_function_mock(self):
+        '''
+        Function mocks should be recorded in bulk by the function's name
+        '''
+        def some_function(x):
+            return x
+
+        mock = mockaccino.create_mock(some_function)
+        mockaccino.record_all(mock, [("some_function", (1,), None, 2, None)])
+        mockaccino.replay(mock)
+
+        assert mock(1) == 2
+
+    @raises(ValueError)
+    def test_record_all_exception_class(self):
+        '''
+        An exception class, rather than an instance, should be refused as an
+        outcome
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        mockaccino.record_all(mock, [("method_with_parameter", (1,), None,
+                                      ValueError, None)])
+
+    @raises(ValueError)
+    def test_record_all_on_replay_mode(self):
+        '''
+        Recording in bulk on replay mode should be refused
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+        mockaccino.replay(mock)
+
+        mockaccino.record_all(mock, [("method_with_parameter", (1,), None,
+                                      None, None)])
+
+    def test_expectation_count_down(self):
+        '''
+        Expectations counted down by hand should be depleted once all their
+        expected calls were counted
+        '''
+        expectation = mockaccino.Expectation("method_with_parameter", (1,))
+        expectation.times(2)
+
+        expectation.count_down()
+        assert not expectation.depleted()
+
+        expectation.count_down()
+        assert expectation.depleted()
+
+    def test_met_expectations_are_released(self):
+        '''
+        Expectations met on a mock that can't be rewound should not be kept
+        '''
+        import gc
+        import weakref
+
+        class Value(object):
+            pass
+
+        value = Value()
+        released = weakref.ref(value)
+
+        mock = mockaccino.create_mock(self.MockedClass)
+        mock.method_with_parameter(1).will_return(value)
+        mock.method_with_parameter(2)
+        mockaccino.stream(mock, [])
+        mockaccino.replay(mock)
+
+        del value
+        mock.method_with_parameter(1)
+        gc.collect()
+
+        assert released() is None
+        mock.method_with_parameter(2)
+
+    def test_clones_share_expectations(self):
+        '''
+        Clones of a mock should expect the calls recorded on it, each
+        keeping track of the calls met on it by itself
+        '''
+        template = mockaccino.create_mock(self.MockedClass)
+
+        template.method_with_parameter(1).will_return(2).times(2)
+        template.method_that_returns_an_int().will_return(3)
+        mockaccino.replay(template)
+
+        first = mockaccino.clone(template)
+        second = mockaccino.clone(template)
+
+        assert first.method_with_parameter(1) == 2
+        assert second.method_with_parameter(1) == 2
+        assert second.method_with_parameter(1) == 2
+        assert second.method_that_returns_an_int() == 3
+        assert first.method_with_parameter(1) == 2
+        assert first.method_that_returns_an_int() == 3
+
+        self.assertRaises(mockaccino.UnexpectedCallError,
+                          first.method_that_returns_an_int)
+
+        # Recorded expectations are left as they were recorded
+        assert template.method_with_parameter(1) == 2
+
+    def test_unordered_clones_share_expectations(self):
+        '''
+        Clones of an unordered mock should share its recorded expectations
+        rather than copy them
+        '''
+        template = mockaccino.create_mock(self.MockedClass, ordered=False)
+
+        template.method_with_parameter(1).will_return(2)
+        template.method_with_parameter(3).will_return(4)
+        mockaccino.replay(template)
+
+        clone = mockaccino.clone(template)
+        recorded = "_UnorderedExpectations__recorded"
+
+        assert getattr(clone._Mock__expectations, recorded) is \
+               getattr(template._Mock__expectations, recorded)
+        assert clone.method_with_parameter(3) == 4
+        assert clone.method_with_parameter(1) == 2
+        assert template.method_with_parameter(1) == 2
+
+    def test_clone_function_mock(self):
+        '''
+        Clones of a function mock should be called instead of the template
+        '''
+        def function_to_mock(a):
+            return 0
+
+        template = mockaccino.create_mock(function_to_mock)
+        template(1).will_return(2)
+        mockaccino.replay(template)
+
+        clone = mockaccino.clone(template)
+
+        assert clone(1) == 2
+        assert template(1) == 2
+
+    def test_reset(self):
+        '''
+        Reset mocks should expect all the recorded calls again
+        '''
+        ordered = mockaccino.create_mock(self.MockedClass)
+        unordered = mockaccino.create_mock(self.MockedClass, ordered=False)
+
+        for mock in (ordered, unordered):
+            mock.method_with_parameter(1).will_return(2).times(2)
+            mock.method_with_parameter([]).will_return(3)
+
+        mockaccino.replay(ordered, unordered)
+
+        for mock in (ordered, unordered):
+            assert mock.method_with_parameter(1) == 2
+            mockaccino.reset(mock)
+
+            assert mock.method_with_parameter(1) == 2
+            assert mock.method_with_parameter(1) == 2
+            assert mock.method_with_parameter([]) == 3
+
+            self.assertRaises(mockaccino.UnexpectedCallError,
+                              mock.method_with_parameter, 1)
+
+    def test_cloning_requires_replay_mode(self):
+        '''
+        Mocks that are still recording, or that pull streamed expectations,
+        should not be cloned or reset
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+        mock.method_with_parameter(1)
+
+        self.assertRaises(ValueError, mockaccino.clone, mock)
+        self.assertRaises(ValueError, mockaccino.reset, mock)
+
+        mockaccino.stream(mock, [])
+        mockaccino.replay(mock)
+
+        self.assertRaises(ValueError, mockaccino.clone, mock)
+        self.assertRaises(ValueError, mockaccino.reset, mock)
+
+    @unittest.skipIf(not hasattr(os, "fork"), "os.fork is not available")
+    def test_shared_mock_across_processes(self):
+        '''
+        Processes forked after a mock is shared should meet its recorded
+        calls once between them
+        '''
+        for ordered in (True, False):
+            mock = mockaccino.create_mock(self.MockedClass, ordered=ordered)
+            mock.method_with_parameter(1).will_return(2).times(3)
+            mockaccino.replay(mock)
+            shared.share(mock)
+
+            children = []
+
+            for i in range(3):
+                pid = os.fork()
+
+                if pid == 0:
+                    status = 1
+
+                    try:
+                        status = int(mock.method_with_parameter(1) != 2)
+                    finally:
+                        os._exit(status)
+
+                children.append(pid)
+
+            for pid in children:
+                assert os.waitpid(pid, 0)[1] == 0
+
+            self.assertRaises(mockaccino.UnexpectedCallError,
+                              mock.method_with_parameter, 1)
+
+            mockaccino.reset(mock)
+            assert mock.method_with_parameter(1) == 2
+
+    def test_sharing_requires_replay_mode(self):
+        '''
+        Mocks that are still recording should not be shared, and shared
+        mocks should not be cloned
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+        mock.method_with_parameter(1)
+
+        self.assertRaises(ValueError, shared.share, mock)
+
+        mockaccino.replay(mock)
+        shared.share(mock)
+
+        self.assertRaises(ValueError, mockaccino.clone, mock)
+
+    def test_unexpected_call_reports_nearest_expectations(self):
+        '''
+        Unexpected calls should be reported along with the pending
+        expectations for the same method closest to them
+        '''
+        for ordered in (True, False):
+            mock = mockaccino.create_mock(self.MockedClass, ordered=ordered)
+            mock.method_with_two_parameters(1, b=2)
+            mock.method_with_parameter(3)
+            mock.method_with_two_parameters(3, b=4)
+            mock.method_with_two_parameters(3, b=[5])
+            mockaccino.replay(mock)
+
+            try:
+                mock.method_with_two_parameters(3, b=[5, 6])
+            except mockaccino.UnexpectedCallError as error:
+                assert [(e.args, e.kwargs) for e in error.candidates] == \
+                       [((3,), {"b": 4}), ((3,), {"b": [5]}),
+                        ((1,), {"b": 2})]
+                assert "Closest pending calls" in str(error)
+            else:
+                assert False, "The call should have been unexpected"
+
+    def test_nearest_expectations_are_found_once_used(self):
+        '''
+        Pending expectations should only be compared with an unexpected call
+        once its candidates are used, and large arguments not walked
+        '''
+        class Counted(object):
+            comparisons = 0
+
+            def __init__(self, n):
+                self.n = n
+
+            def __eq__(self, other):
+                Counted.comparisons += 1
+                return isinstance(other, Counted) and self.n == other.n
+
+            __hash__ = None
+
+        for ordered in (True, False):
+            for size in (1, 1000):
+                mock = mockaccino.create_mock(self.MockedClass,
+                                              ordered=ordered)
+
+                for i in range(100):
+                    mock.method_with_parameter([Counted(i)] * size)
+
+                mockaccino.replay(mock)
+
+                try:
+                    mock.method_with_parameter([Counted(-1)] * size)
+                except mockaccino.UnexpectedCallError as error:
+                    compared = Counted.comparisons
+
+                    assert len(error.candidates) == 3
+                    # Small arguments are compared, only now
+                    assert (Counted.comparisons > compared) == (size == 1)
+                else:
+                    assert False, "The call should have been unexpected"
+
+    def test_unexpected_call_message_is_bounded(self):
+        '''
+        Large arguments should be shortened in the error message, while the
+        error still holds them whole
+        '''
+        payload = "x" * 1000000
+        mock = mockaccino.create_mock(self.MockedClass)
+        mock.method_with_parameter(payload)
+        mockaccino.replay(mock)
+
+        try:
+            mock.method_with_parameter(payload + "y")
+        except mockaccino.UnexpectedCallError as error:
+            assert len(str(error)) < 1000
+            assert len(repr(error)) < 1000
+            assert error.expected[1][0] is payload
+            assert len(error.got[1][0]) == len(payload) + 1
+        else:
+            assert False, "The call should have been unexpected"
+
+    def test_unexpected_call_message_shows_differences(self):
+        '''
+        The error message should point out only the parts of the arguments
+        that differ from the expected ones
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+        mock.method_with_two_parameters(1, b={"c": [1, 2], "d": "same"})
+        mockaccino.replay(mock)
+
+        try:
+            mock.method_with_two_parameters(1, b={"c": [1, 3], "d": "same"})
+        except mockaccino.UnexpectedCallError as error:
+            message = str(error)
+
+            assert "kwargs['b']['c'][1]: expected 2, got 3" in message
+            assert "args[0]" not in message
+            assert "['d']" not in message
+        else:
+            assert False, "The call should have been unexpected"
+
+    def test_unexpected_call_error_with_a_message_only(self):
+        '''
+        Errors built with a message as their only argument should render it
+        '''
+        error = mockaccino.UnexpectedCallError("some text")
+
+        assert str(error) == "some text"
+        assert "some text" in repr(error)
+
+    def test_unexpected_call_error_without_a_got_call(self):
+        '''
+        Errors built with an expected call only should render it, without
+        differences
+        '''
+        error = mockaccino.UnexpectedCallError(("method", (1,), {"b": 2}))
+
+        assert str(error) == "Expected method(1, b=2)"
+
+    def test_unexpected_call_differences_are_bounded(self):
+        '''
+        Only the first items of large arguments should be looked into when
+        rendering the differences
+        '''
+        class Key(object):
+            reprs = 0
+
+            def __init__(self, n):
+                self.n = n
+
+            def __hash__(self):
+                return self.n
+
+            def __eq__(self, other):
+                return isinstance(other, Key) and other.n == self.n
+
+            def __ne__(self, other):
+                return not self == other
+
+            def __repr__(self):
+                Key.reprs += 1
+                return "Key(%d)" % self.n
+
+        expected = dict((Key(i), i) for i in range(100000))
+        got = dict(expected)
+        got[Key(0)] = -1
+
+        mock = mockaccino.create_mock(self.MockedClass)
+        mock.method_with_parameter(expected)
+        mockaccino.replay(mock)
+
+        try:
+            mock.method_with_parameter(got)
+        except mockaccino.UnexpectedCallError as error:
+            assert "args[0][Key(0)]: expected 0, got -1" in str(error)
+            assert Key.reprs < 1000
+        else:
+            assert False, "The call should have been unexpected"
+
+    def test_identical_recorded_arguments_are_shared(self):
+        '''
+        Identical recorded arguments should be stored only once, and
+        expectations should not carry an instance dictionary
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        first = mock.method_with_two_parameters(1, b="x")
+        second = mock.method_with_two_parameters(1, b="x").will_return(2) \
+                                                         .times(2)
+        third = mock.method_with_two_parameters(True, b="x")
+
+        assert first.args is second.args
+        assert first.kwargs is second.kwargs
+        assert third.args is not first.args
+        assert not hasattr(first, "__dict__")
+
+        mockaccino.replay(mock)
+
+        mock.method_with_two_parameters(1, b="x")
+        assert mock.method_with_two_parameters(1, b="x") == 2
+        assert mock.method_with_two_parameters(1, b="x") == 2
+
+    def test_equal_nested_arguments_of_other_types_are_kept(self):
+        '''
+        Recorded arguments holding equal values of different types, however
+        nested, should not be shared
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        first = mock.method_with_parameter(((1,),))
+        second = mock.method_with_parameter(((True,),)).will_return(1)
+
+        assert type(first.args[0][0][0]) is int
+        assert type(second.args[0][0][0]) is bool
+
+    def test_repeated_identical_calls_are_merged(self):
+        '''
+        Back to back identical calls with identical outcomes should be
+        recorded as a single expectation, and replayed the same way
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        for i in range(300):
+            mock.method_with_parameter(1).will_return("one")
+
+        mock.method_with_parameter(1).will_return("one").times(2)
+        mock.method_with_parameter(1).will_return("other")
+        mock.method_with_no_return_value()
+
+        mockaccino.replay(mock)
+
+        pending = mock._recorded_expectations()[1]
+
+        assert len(pending) == 3
+        assert pending[0]._times == 302
+
+        for i in range(302):
+            assert mock.method_with_parameter(1) == "one"
+
+        assert mock.method_with_parameter(1) == "other"
+        mock.method_with_no_return_value()
+
+    def test_calls_returning_mutable_values_are_not_merged(self):
+        '''
+        Calls returning distinct mutable values should keep returning
+        distinct values
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        mock.method_that_returns_an_int().will_return([])
+        mock.method_that_returns_an_int().will_return([])
+
+        mockaccino.replay(mock)
+
+        assert mock.method_that_returns_an_int() is not \
+               mock.method_that_returns_an_int()
+
+    @raises(mockaccino.UnexpectedCallError)
+    def test_merged_calls_are_depleted(self):
+        '''
+        Merged expectations should not allow more calls than were recorded
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        mock.method_with_parameter(1)
+        mock.method_with_parameter(1)
+
+        mockaccino.replay(mock)
+
+        mock.method_with_parameter(1)
+        mock.method_with_parameter(1)
+        mock.method_with_parameter(1)
+
+    def test_builtin_matchers(self):
+        '''
+        Built-in matchers should match the values they describe
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        mock.method_with_parameter(that(lambda n: n % 2 == 0)) \
+                .will_return("even")
+        mock.method_with_parameter(regex(r"^user-\d+$")).will_return("user")
+        mock.method_with_parameter(between(1, 10)).will_return("small")
+        mock.method_with_parameter(contains("key")).will_return("has key")
+        mock.method_with_parameter(any_of("a", any(float))) \
+                .will_return("a or float")
+        mock.method_with_two_parameters(1, b=any(int)).will_return("b int")
+
+        mockaccino.replay(mock)
+
+        assert mock.method_with_parameter(4) == "even"
+        assert mock.method_with_parameter("user-12") == "user"
+        assert mock.method_with_parameter(10) == "small"
+        assert mock.method_with_parameter({"key": 1}) == "has key"
+        assert mock.method_with_parameter(0.5) == "a or float"
+        assert mock.method_with_two_parameters(1, b=2) == "b int"
+
+    @raises(mockaccino.UnexpectedCallError)
+    def test_regex_matcher_fails_on_non_strings(self):
+        '''
+        The regex matcher should not match values that aren't strings
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+        mock.method_with_parameter(regex("1"))
+        mockaccino.replay(mock)
+        mock.method_with_parameter(1)
+
+    def test_shape_matcher(self):
+        '''
+        The shape matcher should match nested values item by item
+        '''
+        matcher = shape({"id": any(int), "tags": [any(str), "fixed"]})
+
+        assert matcher == {"id": 1, "tags": ["x", "fixed"]}
+        assert matcher != {"id": 1, "tags": ["x", "other"]}
+        assert matcher != {"id": 1, "tags": ["x", "fixed"], "extra": 1}
+        assert matcher != {"id": 1, "tags": ("x", "fixed")}
+
+    @raises(mockaccino.UnexpectedCallError)
+    def test_matcher_plan_checks_kwargs_names(self):
+        '''
+        Expectations recorded with matchers should not match calls with
+        other keyword arguments
+        '''
+        mock = mockaccino.create_mock(self.MockedClass)
+        mock.method_with_two_parameters(any(int), b=1)
+        mockaccino.replay(mock)
+        mock.method_with_two_parameters(1, c=1)
+
+    def test_matchers_are_compiled_when_recorded(self):
+        '''
+        Expectations with matchers should have a plan, while others should
+        not need one
+        '''
+        assert mockaccino.Expectation("m", (any(int), 1))._plan is not None
+        assert mockaccino.Expectation("m", (1, [2]))._plan is None
+
+    def test_captor_keeps_passed_values(self):
+        '''
+        Captors should keep the values passed in calls that met their
+        expectation
+        '''
+        values = captor()
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        mock.method_with_two_parameters(values, b=1).times(2)
+        mock.method_with_two_parameters("not captured", b=2)
+
+        mockaccino.replay(mock)
+
+        mock.method_with_two_parameters("first", b=1)
+        mock.method_with_two_parameters("second", b=1)
+
+        try:
+            mock.method_with_two_parameters("mismatch", b=3)
+        except mockaccino.UnexpectedCallError:
+            pass
+
+        assert list(values.values) == ["first", "second"]
+        assert values.value == "second"
+
+    def test_captor_ring_buffer_is_bounded(self):
+        '''
+        Captors with a capacity should only keep the last values
+        '''
+        values = captor(capacity=3)
+        mock = mockaccino.create_mock(self.MockedClass)
+        mock.method_with_parameter(parameter=values).always()
+        mockaccino.replay(mock)
+
+        for i in range(10000):
+            mock.method_with_parameter(parameter=i)
+
+        assert list(values.values) == [9997, 9998, 9999]
+        assert values.count == 10000
+
+    def test_captor_is_bounded_by_default(self):
+        '''
+        Captors should keep a bounded number of values unless asked to keep
+        all of them
+        '''
+        from mockaccino.matchers import Captor
+
+        bounded = captor()
+        unbounded = captor(capacity=None)
+
+        for i in range(Captor.CAPACITY + 1):
+            bounded.capture(i)
+            unbounded.capture(i)
+
+        assert len(bounded.values) == Captor.CAPACITY
+        assert bounded.value == Captor.CAPACITY
+        assert len(unbounded.values) == Captor.CAPACITY + 1
+
+    def test_captor_with_callback(self):
+        '''
+        Captors with a callback should pass values to it instead of keeping
+        them
+        '''
+        received = []
+        values = captor(on_capture=received.append)
+        mock = mockaccino.create_mock(self.MockedClass)
+        mock.method_with_parameter(values).always()
+        mockaccino.replay(mock)
+
+        mock.method_with_parameter(1)
+        mock.method_with_parameter(2)
+
+        assert received == [1, 2]
+        assert not values.values
+
+    def test_arguments_with_a_capture_method_are_not_captors(self):
+        '''
+        Recorded arguments that happen to have a capture method should not
+        be given the values of the calls
+        '''
+        class Camera(object):
+            def __init__(self):
+                self.shots = []
+
+            def capture(self, value):
+                self.shots.append(value)
+
+        camera = Camera()
+        mock = mockaccino.create_mock(self.MockedClass)
+        mock.method_with_two_parameters(camera, b=any(int))
+        mockaccino.replay(mock)
+
+        mock.method_with_two_parameters(camera, b=1)
+
+        assert camera.shots == []
+
+    def test_call_statistics(self):
+        '''
+        Mocks should count invocations, matches and mismatches per method
+        while statistics are enabled
+        '''
+        from mockaccino import stats
+
+        mock = mockaccino.create_mock(self.MockedClass)
+
+        mock.method_with_parameter(1).times(2)
+        mock.method_with_parameter([0] * 1000)
+        mock.method_that_returns_an_int().will_raise(ValueError())
+        mock.method_with_parameter(2)
+
+        mockaccino.replay(mock)
+
+        stats.enable()
+
+        try:
+            assert stats.enabled()
+
+            mock.method_with_parameter(1)
+            mock.method_with_parameter(1)
+            mock.method_with_parameter([0] * 1000)
+
+            for i in range(2):
+                try:
+                    mock.method_that_returns_an_int()
+                except (ValueError, mockaccino.UnexpectedCallError):
+                    pass
+        finally:
+            stats.disable()
+
+        assert not stats.enabled()
+
+        mock.method_with_parameter(2)
+
+        by_method = stats.of(mock)
+        with_parameter = by_method["method_with_parameter"]
+        returns_an_int = by_method["method_that_returns_an_int"]
+
+        assert with_parameter.invocations == with_parameter.matches == 3
+        assert with_parameter.mismatches == 0
+        assert with_parameter.time > 0
+        assert sum(with_parameter.sizes.values()) == 3
+        assert len(with_parameter.sizes) == 2
+        assert returns_an_int.matches == returns_an_int.mismatches == 1
+
+        total = stats.aggregate()[(type(mock).__name__,
+                                   "method_with_parameter")]
+
+        assert total.invocations >= 3
+
+        stats.reset()
+
+        assert stats.of(mock) == {}
+
+    def test_stats_of_a_mock_shared_by_many_threads(self):
+        '''
+        Statistics should count every call made by concurrent threads
+        '''
+        import threading
+
+        from mockaccino import stats
+
+        threads, calls = 8, 2000
+
+        mock = mockaccino.create_mock(self.MockedClass, thread_safe=True)
+        mock.method_with_parameter(1).will_return(2).always()
+        mockaccino.replay(mock)
+
+        def worker():
+            for i in range(calls):
+                mock.method_with_parameter(1)
+
+        workers = [threading.Thread(target=worker) for i in range(threads)]
+        stats.enable()
+
+        try:
+            for thread in workers:
+                thread.start()
+
+            for thread in workers:
+                thread.join()
+        finally:
+            stats.disable()
+
+        with_parameter = stats.of(mock)["method_with_parameter"]
+        stats.reset()
+
+        assert with_parameter.invocations == threads * calls
+        assert with_parameter.matches == threads * calls
+        assert sum(with_parameter.sizes.values()) == threads * calls
+
+    def test_benchmark_regressions_against_baseline(self):
+        '''
+        Benchmark cases slower than their baseline by more than the
+        tolerance should be reported as regressions
+        '''
+        from mockaccino.benchmarks import regressions
+
+        baseline = {"record": 100.0, "replay_always": 100.0, "old": 1.0}
+        results = {"record": 124.0, "replay_always": 126.0, "new": 1e9}
+
+        assert regressions(results, baseline, 0.25) == \
+               [("replay_always", 100.0, 126.0)]
+
+    def test_benchmark_regressions_relative_to_reference(self):
+        '''
+        Baseline times should be scaled by the ratio between the reference
+        cases of both runs, and memory cases compared as they are
+        '''
+        from mockaccino.benchmarks import regressions
+
+        baseline = {"reference": 50.0, "record": 100.0,
+                    "replay_always": 100.0, "expectation_footprint": 100.0}
+        results = {"reference": 100.0, "record": 240.0,
+                   "replay_always": 260.0, "expectation_footprint": 130.0}
+
+        assert regressions(results, baseline, 0.25) == \
+               [("expectation_footprint", 100.0, 130.0),
+                ("replay_always", 200.0, 260.0)]
+
+    def test_benchmark_regressions_with_case_tolerances(self):
+        '''
+        Cases with a tolerance of their own should be compared with it
+        rather than with the one given
+        '''
+        from mockaccino.benchmarks import regressions
+
+        baseline = {"record": 100.0, "import": 100.0}
+        results = {"record": 140.0, "import": 140.0}
+
+        assert regressions(results, baseline, 0.25, {"import": 0.5}) == \
+               [("record", 100.0, 140.0)]
+
+    def test_import_cost_leaves_the_package_untouched(self):
+        '''
+        Timing the import should byte-compile a copy of the package rather
+        than the package itself
+        '''
+        from mockaccino.benchmarks import import_cost
+
+        package = os.path.dirname(os.path.abspath(__file__))
+        before = sorted(os.listdir(package))
+
+        assert import_cost() > 0
+        assert sorted(os.listdir(package)) == before
+
+    def test_package_imports_submodules_lazily(self):
+        '''
+        Importing mockaccino should not import its submodules, whose public
+        names should still be available from it
+        '''
+        import subprocess
+        import sys
+
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.check_output(
+                [sys.executable, "-c",
+                 "import sys, mockaccino\n"
+                 "print('mockaccino.mocks' in sys.modules)\n"
+                 "mockaccino.create_mock\n"
+                 "print('mockaccino.mocks' in sys.modules)\n"], cwd=root)
+
+        assert output.split() == [b"False", b"True"]
+
+        for submodule in ("mocks", "recording", "cassettes", "shared"):
+            names = getattr(mockaccino, submodule).__all__
+
+            for name in names:
+                assert name in mockaccino.__all__
+                assert getattr(mockaccino, name) is \
+                       getattr(getattr(mockaccino, submodule), name)
+
+    @unittest.skipUnless(TIMING_TESTS, "MOCKACCINO_TIMING_TESTS is not set")
+    def test_import_time_within_budget(self):
+        '''
+        A new process should import mockaccino and look up create_mock within
+        the import budget
+        '''
+        from mockaccino.benchmarks import IMPORT_BUDGET, import_cost
+
+        assert min(import_cost() for i in range(3)) < IMPORT_BUDGET
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright (c) 2012, Paolo Victor.
+
+Permission is hereby granted, free of charge, to any person
+obtaining a copy of this software and associated documentation
+files (the "Software"), to deal in the Software without
+restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following
+conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+    OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+    NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+    HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+    WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+
+Clocks and latency profiles used to simulate slow calls on mocks. Latencies
+are given in milliseconds
+'''
+
+import bisect
+import time
+
+
+class Clock(object):
+    '''
+    Clock that really waits for simulated latencies. It keeps the total
+    latency it simulated, in seconds, on its "elapsed" attribute
+    '''
+    def __init__(self):
+        self.elapsed = 0.0
+
+    def sleep(self, seconds):
+        self.elapsed += seconds
+        time.sleep(seconds)
+
+    def call_later(self, loop, seconds, callback, *args):
+        self.elapsed += seconds
+        loop.call_later(seconds, callback, *args)
+
+
+class VirtualClock(Clock):
+    '''
+    Clock that never waits. Simulated latencies only move its "now"
+    attribute forward, so tests run in virtual time
+    '''
+    def __init__(self):
+        super(VirtualClock, self).__init__()
+        self.now = 0.0
+
+    def sleep(self, seconds):
+        self.elapsed += seconds
+        self.now += seconds
+
+    def call_later(self, loop, seconds, callback, *args):
+        self.elapsed += seconds
+        self.now += seconds
+        loop.call_soon(callback, *args)
+
+
+class Fixed(object):
+    '''
+    Latency profile in which every call takes the same time
+    '''
+    def __init__(self, ms):
+        if ms < 0:
+            raise ValueError("Latency must not be negative")
+
+        self.ms = ms
+
+    def __eq__(self, other):
+        return isinstance(other, Fixed) and self.ms == other.ms
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.ms)
+
+    def sample(self):
+        return self.ms
+
+
+class Percentiles(object):
+    '''
+    Latency profile given by some of its percentiles, such as
+    Percentiles({50: 10, 99: 250}). Samples are interpolated linearly between
+    the given percentiles
+    '''
+    def __init__(self, percentiles, rng=None):
+        points = sorted(percentiles.items())
+
+        if not points:
+            raise ValueError("At least one percentile is required")
+
+        for (rank, ms), (next_rank, next_ms) in zip(points, points[1:]):
+            if next_ms < ms:
+                raise ValueError("Latencies must not decrease as " +
+                                 "percentiles increase")
+
+        if points[0][0] < 0 or points[-1][0] > 100 or points[0][1] < 0:
+            raise ValueError("Percentiles must be between 0 and 100, and " +
+                             "latencies must not be negative")
+
+        if points[0][0] > 0:
+            points.insert(0, (0, points[0][1]))
+
+        if points[-1][0] < 100:
+            points.append((100, points[-1][1]))
+
+        self.__ranks = [rank for (rank, ms) in points]
+        self.__latencies = [ms for (rank, ms) in points]
+
+        if rng is None:
+            import random
+
+            rng = random.Random()
+
+        self.__random = rng
+
+    def sample(self):
+        rank = self.__random.random() * 100
+        i = max(bisect.bisect_right(self.__ranks, rank), 1)
+
+        low_rank, high_rank = self.__ranks[i - 1], self.__ranks[i]
+        low, high = self.__latencies[i - 1], self.__latencies[i]
+
+        if high_rank == low_rank:
+            return high
+
+        return low + (high - low) * (rank - low_rank) / (high_rank - low_rank)
+
+
+default_clock = Clock()